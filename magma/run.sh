@@ -13,12 +13,15 @@
 # - env TIMEOUT: time to run the campaign
 # - env MAGMA: path to Magma support files
 # + env LOGSIZE: size (in bytes) of log file to generate (default: 1 MiB)
+# + env TIMELINE: if set, polls are appended to a single change-only timeline
+#       file instead of one file per poll (default: unset)
 ##
 
 # set default max log size to 1 MiB
 LOGSIZE=${LOGSIZE:-$[1 << 20]}
 
 export MONITOR="$SHARED/monitor"
+export TIMELINE_FILE="$SHARED/monitor.timeline"
 mkdir -p "$MONITOR"
 
 # change working directory to somewhere accessible by the fuzzer and target
@@ -46,21 +49,58 @@ fi
 
 # launch the fuzzer in parallel with the monitor
 rm -f "$MONITOR/tmp"*
-polls=("$MONITOR"/*)
-if [ ${#polls[@]} -eq 0 ]; then
-    counter=0
+if [ ! -z $TIMELINE ]; then
+    # the last frame header holds the timestamp of the last recorded poll
+    last=$(grep -aoE '^[HR] [0-9]+ [0-9]+$' "$TIMELINE_FILE" 2>/dev/null | \
+        tail -n1 | cut -d' ' -f2)
+    if [ -z "$last" ]; then
+        counter=0
+    else
+        counter=$(( last + POLL ))
+    fi
 else
-    timestamps=($(sort -n < <(basename -a "${polls[@]}")))
-    last=${timestamps[-1]}
-    counter=$(( last + POLL ))
+    polls=("$MONITOR"/*)
+    if [ ${#polls[@]} -eq 0 ]; then
+        counter=0
+    else
+        timestamps=($(sort -n < <(basename -a "${polls[@]}")))
+        last=${timestamps[-1]}
+        counter=$(( last + POLL ))
+    fi
 fi
 
+##
+# Appends a frame to the timeline file. Every frame consists of a line
+# "<kind> <timestamp> <length>" followed by <length> bytes of payload, where
+# kind H carries the CSV header of the canary counters and kind R a CSV row.
+# - $1: the frame kind (H or R)
+# - $2: the timestamp of the poll
+# - $3: the payload line
+##
+append_frame()
+{
+    printf '%s %d %d\n%s\n' "$1" "$2" $(( ${#3} + 1 )) "$3" >> "$TIMELINE_FILE"
+}
+
 while true; do
     "$OUT/monitor" --dump row > "$MONITOR/tmp"
-    if [ $? -eq 0 ]; then
+    if [ $? -ne 0 ]; then
+        rm "$MONITOR/tmp"
+    elif [ -z $TIMELINE ]; then
         mv "$MONITOR/tmp" "$MONITOR/$counter"
     else
+        # only record polls where some canary counter changed
+        { read -r header; read -r row; } < "$MONITOR/tmp"
         rm "$MONITOR/tmp"
+        if [ "$header" != "$last_header" ]; then
+            append_frame H $counter "$header"
+            last_header="$header"
+            last_row=
+        fi
+        if [ "$row" != "$last_row" ]; then
+            append_frame R $counter "$row"
+            last_row="$row"
+        fi
     fi
     counter=$(( counter + POLL ))
     sleep $POLL
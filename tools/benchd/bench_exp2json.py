@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+
+"""
+Generates a synthetic Captain workdir and measures the throughput of the
+exp2json ingestion stages on it: campaign discovery, extraction of the monitor
+dumps, parsing them into a DataFrame and computing the time-to-bug summary.
+"""
+
+import argparse
+import io
+import logging
+import os
+import resource
+import shutil
+import tarfile
+from tempfile import mkdtemp
+import time
+
+import numpy as np
+
+import exp2json
+from timeline import TIMELINE_BASENAME
+
+LAYOUTS = ('tar', 'dir')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=(
+        "Generates a synthetic Captain workdir and benchmarks the stages of "
+        "exp2json on it."
+    ))
+    parser.add_argument("--fuzzers", type=int, default=2,
+        help="The number of fuzzers in the synthetic workdir.")
+    parser.add_argument("--targets", type=int, default=2,
+        help="The number of targets per fuzzer.")
+    parser.add_argument("--programs", type=int, default=2,
+        help="The number of programs per target.")
+    parser.add_argument("--runs", type=int, default=5,
+        help="The number of campaigns per program.")
+    parser.add_argument("--polls", type=int, default=1000,
+        help="The number of monitor polls per campaign.")
+    parser.add_argument("--canaries", type=int, default=20,
+        help="The number of canaries per target.")
+    parser.add_argument("--poll-interval", type=int, default=5,
+        help="The time (in seconds) between two polls.")
+    parser.add_argument("--layout", choices=LAYOUTS, default='tar',
+        help=("Whether campaigns are tarballed (tar) or left as directories, "
+            "as with NO_ARCHIVE (dir)."))
+    parser.add_argument("--timeline", action="store_true",
+        help=("Record polls in a change-only timeline file instead of one file "
+            "per poll."))
+    parser.add_argument("--seed", type=int, default=0,
+        help="The seed for the random generation of canary counters.")
+    parser.add_argument("--workdir",
+        help=("Where to generate the synthetic workdir. If it already contains "
+            "an ar directory, it is benchmarked as-is. By default, a temporary "
+            "directory is used and removed afterwards."))
+    parser.add_argument("--workers", type=int, default=4,
+        help="The number of processes for the end-to-end run.")
+    parser.add_argument("--io-threads", type=int, default=0,
+        help="The number of I/O threads for the end-to-end run.")
+    parser.add_argument("--extract", action="store_true",
+        help="Extract tarballs with tar instead of streaming them in-process.")
+    parser.add_argument('-v', '--verbose', action='count', default=0,
+        help=("Controls the verbosity of messages. "
+            "-v prints info. -vv prints debug. Default: warnings and higher.")
+        )
+    return parser.parse_args()
+
+
+def generate_polls(rng, polls, canaries, interval):
+    """
+    Yields (timestamp, dump) pairs for a campaign with cumulative reached and
+    triggered counters, where canaries appear in the header once reached.
+    """
+    # every canary has its own hit rate, and most are never triggered
+    rates = rng.exponential(5.0, canaries) * (rng.random(canaries) < 0.8)
+    reached = np.cumsum(rng.poisson(rates, (polls, canaries)), axis=0)
+    trigger_rates = 0.01 * (rng.random(canaries) < 0.2)
+    triggered = np.cumsum(rng.poisson(trigger_rates, (polls, canaries)), axis=0)
+    triggered[reached == 0] = 0
+
+    names = [f"SYN{i:03d}" for i in range(canaries)]
+    # canaries only appear in the storage once they are first reached
+    appear = np.where(reached.any(axis=0), (reached > 0).argmax(axis=0), polls)
+    order = np.argsort(appear, kind='stable')
+    for k in range(polls):
+        visible = order[:np.searchsorted(appear[order], k, side='right')]
+        header = ",".join(f"{names[i]}_R,{names[i]}_T" for i in visible)
+        row = ",".join(f"{reached[k, i]},{triggered[k, i]}" for i in visible)
+        yield str(k * interval), f"{header}\n{row}\n".encode()
+
+
+def encode_timeline(dumps):
+    frames = []
+    last_header = last_row = None
+    for timestamp, data in dumps:
+        header, row, _ = data.split(b'\n')
+        if header != last_header:
+            frames.append(b"H %s %d\n%s\n" % (timestamp.encode(),
+                len(header) + 1, header))
+            last_header, last_row = header, None
+        if row != last_row:
+            frames.append(b"R %s %d\n%s\n" % (timestamp.encode(),
+                len(row) + 1, row))
+            last_row = row
+    return b"".join(frames)
+
+
+def generate_workdir(workdir, args):
+    rng = np.random.default_rng(args.seed)
+    for f in range(args.fuzzers):
+        for t in range(args.targets):
+            for p in range(args.programs):
+                for r in range(args.runs):
+                    path = os.path.join(workdir, "ar", f"fuzzer{f}",
+                        f"target{t}", f"program{p}", str(r))
+                    os.makedirs(path)
+                    dumps = generate_polls(rng, args.polls, args.canaries,
+                        args.poll_interval)
+                    if args.timeline:
+                        files = {TIMELINE_BASENAME: encode_timeline(dumps)}
+                    else:
+                        files = {os.path.join("monitor", timestamp): data
+                            for timestamp, data in dumps}
+                    write_campaign(path, files, args.layout)
+    logging.info("Generated %d campaigns in %s",
+        args.fuzzers * args.targets * args.programs * args.runs, workdir)
+
+
+def write_campaign(path, files, layout):
+    if layout == 'tar':
+        with tarfile.open(os.path.join(path, "ball.tar"), "w") as tar:
+            for name, data in files.items():
+                info = tarfile.TarInfo(os.path.join(".", name))
+                info.size = len(data)
+                info.mtime = time.time()
+                tar.addfile(info, io.BytesIO(data))
+    else:
+        os.makedirs(os.path.join(path, "monitor"))
+        for name, data in files.items():
+            with open(os.path.join(path, name), "wb") as f:
+                f.write(data)
+
+
+def benchmark(workdir, workers, extract, io_threads):
+    timings = dict.fromkeys(('discovery', 'extraction', 'parsing', 'ttb'), 0.0)
+    polls = 0
+
+    start = time.perf_counter()
+    campaigns = exp2json.discover_campaigns(workdir)
+    timings['discovery'] = time.perf_counter() - start
+
+    tmpdir = None
+    if extract:
+        tmpdir = os.path.join(workdir, "tmp")
+        exp2json.ensure_dir(tmpdir)
+    # every stage is timed separately, one campaign at a time
+    for path in campaigns:
+        start = time.perf_counter()
+        dumps = exp2json.load_monitor_dumps(path, tmpdir)
+        end = time.perf_counter()
+        timings['extraction'] += end - start
+
+        start = end
+        df = exp2json.generate_monitor_df(dumps, path)
+        end = time.perf_counter()
+        timings['parsing'] += end - start
+
+        start = end
+        if df is not None:
+            exp2json.get_ttb_from_df(df)
+            polls += len(df)
+        timings['ttb'] += time.perf_counter() - start
+    if tmpdir is not None:
+        shutil.rmtree(tmpdir)
+    self_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    start = time.perf_counter()
+    exp2json.collect_experiment_data(workdir, workers, extract,
+        campaigns=campaigns, io_threads=io_threads)
+    timings['end-to-end'] = time.perf_counter() - start
+    children_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+
+    print(f"{len(campaigns)} campaigns, {polls} polls")
+    print(f"{'stage':<12} {'seconds':>10} {'campaigns/s':>12}")
+    for stage, seconds in timings.items():
+        rate = len(campaigns) / seconds if seconds > 0 else float('inf')
+        print(f"{stage:<12} {seconds:>10.3f} {rate:>12.1f}")
+    # ru_maxrss is reported in KiB on Linux
+    print(f"peak RSS: {self_rss / 1024:.1f} MiB (stages), "
+        f"{children_rss / 1024:.1f} MiB (largest end-to-end worker)")
+
+
+def main():
+    args = parse_args()
+    exp2json.configure_verbosity(args.verbose)
+
+    workdir = args.workdir or mkdtemp(prefix="exp2json_bench_")
+    if not os.path.isdir(os.path.join(workdir, "ar")):
+        generate_workdir(workdir, args)
+    try:
+        benchmark(workdir, args.workers, args.extract, args.io_threads)
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main()
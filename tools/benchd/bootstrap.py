@@ -0,0 +1,107 @@
+"""
+Batched bootstrap confidence intervals for time-to-bug statistics.
+
+All groups (e.g., every fuzzer, target, program and bug) are resampled at once,
+as a (groups x replicates x trials) array. Every group is resampled with the
+same replicate indices, drawn from a seeded generator, so that the interval of
+a group does not depend on which other groups it is computed with.
+"""
+
+from typing import Callable, Optional, Tuple
+
+import numpy as np
+
+import kaplan_meier
+
+DEFAULT_REPLICATES = 1000
+DEFAULT_CONFIDENCE = 0.95
+# upper bound on the number of resampled values held in memory at once
+MAX_CHUNK_ELEMENTS = 1 << 23
+
+
+def resample_indices(trials: int, replicates: int, seed: int,
+                     sizes: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Draw the trial indices of every bootstrap replicate. Without `sizes`, the
+    result is a (replicates x trials) array. Otherwise, it is a (groups x
+    replicates x trials) array where the indices of a group only cover its
+    first sizes[group] trials; the indices beyond those are to be ignored.
+    """
+    rng = np.random.default_rng(seed)
+    if sizes is None:
+        return rng.integers(0, trials, (replicates, trials))
+    uniform = rng.random((replicates, trials))
+    sizes = np.asarray(sizes)[:, None, None]
+    return np.minimum((uniform * sizes).astype(np.int64), sizes - 1)
+
+
+def percentile_interval(samples: np.ndarray,
+                        confidence: float = DEFAULT_CONFIDENCE
+                        ) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Return the bounds of the percentile interval of the replicates along the
+    last axis. The bounds are order statistics of the replicates, so that
+    infinite replicates are handled like any other value.
+    """
+    samples = np.sort(samples, axis=-1)
+    count = samples.shape[-1]
+    lower = int(np.floor((1 - confidence) / 2 * (count - 1)))
+    upper = int(np.ceil((1 + confidence) / 2 * (count - 1)))
+    return samples[..., lower], samples[..., upper]
+
+
+def bootstrap_groups(statistic: Callable[..., np.ndarray],
+                     arrays: Tuple[np.ndarray, ...], replicates: int,
+                     seed: int, confidence: float = DEFAULT_CONFIDENCE,
+                     sizes: Optional[np.ndarray] = None
+                     ) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Compute the bootstrap percentile interval of `statistic` for every group.
+
+    `arrays` hold the (groups x trials) inputs of the statistic. They are
+    resampled along the trials, and `statistic` is called with the resampled
+    (groups x replicates x trials) arrays, and, if `sizes` is given, with the
+    mask of the trials to use. It must return a (groups x replicates) array.
+    """
+    groups, trials = arrays[0].shape
+    if sizes is None:
+        indices = resample_indices(trials, replicates, seed)
+    chunk = max(1, MAX_CHUNK_ELEMENTS // max(1, replicates * trials))
+
+    lower = np.empty(groups)
+    upper = np.empty(groups)
+    for start in range(0, groups, chunk):
+        stop = min(start + chunk, groups)
+        if sizes is None:
+            resampled = tuple(a[start:stop][:, indices] for a in arrays)
+            samples = statistic(*resampled)
+        else:
+            group_indices = resample_indices(trials, replicates, seed,
+                                             sizes[start:stop])
+            rows = np.arange(stop - start)[:, None, None]
+            resampled = tuple(a[start:stop][rows, group_indices]
+                              for a in arrays)
+            valid = np.arange(trials) < sizes[start:stop, None, None]
+            samples = statistic(*resampled, valid)
+        lower[start:stop], upper[start:stop] = \
+            percentile_interval(samples, confidence)
+    return lower, upper
+
+
+def bootstrap_rmst(durations: np.ndarray, observed: np.ndarray, t: float,
+                   replicates: int = DEFAULT_REPLICATES, seed: int = 0,
+                   confidence: float = DEFAULT_CONFIDENCE
+                   ) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Compute the bootstrap percentile interval of the restricted mean survival
+    time (up to `t`) of every row of `durations`.
+    """
+    def rmst(durations, observed):
+        groups, replicates, trials = durations.shape
+        mean, _ = kaplan_meier.restricted_mean_survival_time(
+            durations.reshape(-1, trials), observed.reshape(-1, trials), t)
+        return mean.reshape(groups, replicates)
+
+    return bootstrap_groups(rmst, (np.asarray(durations, dtype=float),
+                                   np.asarray(observed, dtype=bool)),
+                            replicates, seed, confidence)
@@ -2,21 +2,41 @@
 
 import argparse
 from collections import defaultdict
-import csv
+from concurrent.futures import ThreadPoolExecutor
 import errno
+import glob
+import itertools
 import json
 import logging
+import math
 from multiprocessing import Pool
 import os
+import queue
 import shutil
 import subprocess
 import sys
+import tarfile
 from tempfile import mkdtemp
+import time
+import zlib
 
+import numpy as np
 import pandas as pd
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+from timeline import TIMELINE_BASENAME, TimelineFollower, read_timeline
 
 ddr = lambda: defaultdict(ddr)
 
+CACHE_BASENAME = "exp2json_cache.json"
+MANIFEST_BASENAME = "manifest.tsv"
+# bump whenever the contents of a campaign summary change
+CACHE_VERSION = 2
+
 def parse_args():
     parser = argparse.ArgumentParser(description=(
         "Collects data from the experiment workdir and outputs a summary as "
@@ -25,8 +45,63 @@ def parse_args():
     parser.add_argument("--workers",
         default=4,
         help="The number of concurrent processes to launch.")
-    parser.add_argument("workdir",
-        help="The path to the Captain tool output workdir.")
+    parser.add_argument("--io-threads", type=int, default=0,
+        help=("The number of threads which read campaigns from disk and feed "
+            "the raw monitor dumps to the worker processes. By default, "
+            "workers read the campaigns themselves."))
+    parser.add_argument("--prefetch", type=int,
+        help=("The maximum number of campaigns read ahead of the workers with "
+            "--io-threads. Default: twice the number of workers."))
+    parser.add_argument("--extract", action="store_true",
+        help=("Extract tarballed campaigns to a temporary directory using tar "
+            "instead of streaming the monitor dumps in-process."))
+    parser.add_argument("--cache", action="store_true",
+        help=("Reuse the summaries of campaigns which have not changed since "
+            "the last run, and store new ones, in a persistent cache file."))
+    parser.add_argument("--cache-file", metavar="FILE",
+        help=("The path to the cache file used with --cache. "
+            f"Default: {CACHE_BASENAME} in the first WORKDIR"))
+    parser.add_argument("--manifest", action="store_true",
+        help=("Read the list of campaigns from a manifest file instead of "
+            "scanning the workdir. If the manifest does not exist yet, the "
+            "workdir is scanned once and the manifest is written. Every "
+            "WORKDIR has its own manifest."))
+    parser.add_argument("--manifest-file", metavar="FILE",
+        help=("The path to the manifest file used with --manifest, when a "
+            "single WORKDIR is given. "
+            f"Default: WORKDIR/{MANIFEST_BASENAME}"))
+    parser.add_argument("--check-manifest", action="store_true",
+        help=("With --manifest, also scan the workdir for archived campaigns "
+            "missing from the manifest (e.g., archived by older scripts) and "
+            "check the sizes of the listed tarballs. This costs more than a "
+            "plain scan."))
+    parser.add_argument("--timelines", metavar="DIR",
+        help=("Also write the full timeline of every campaign to a Parquet "
+            "dataset in DIR, partitioned by fuzzer, target and program. "
+            "Requires pyarrow."))
+    parser.add_argument("--series", action="store_true",
+        help=("Add a downsampled series of the reached and triggered counters "
+            "of every bug to the summary, sampled at log-spaced times."))
+    parser.add_argument("--series-base", type=parse_series_base, default=2.0,
+        metavar="BASE",
+        help=("The ratio between consecutive sample times of --series, which "
+            "are the powers of BASE, in seconds. Default: 2"))
+    parser.add_argument("--stats", metavar="FILE",
+        help=("Write per-campaign timings of every processing phase, and "
+            "metrics about the worker pool, to FILE as JSON."))
+    parser.add_argument("--shard", type=parse_shard, metavar="I/N",
+        help=("Only process the I-th of N disjoint subsets of the campaigns "
+            "(0 <= I < N), to split the work across machines. Partial results "
+            "can be combined with mergejson.py."))
+    parser.add_argument("--follow", action="store_true",
+        help=("Keep running and periodically update the output file with the "
+            "results of finished campaigns and the progress of live ones."))
+    parser.add_argument("--interval", type=int, default=60,
+        help="The time (in seconds) between updates in --follow mode.")
+    parser.add_argument("workdirs", nargs="+", metavar="workdir",
+        help=("The path to the Captain tool output workdir. Several workdirs "
+            "(e.g., the per-job workdirs of a distributed experiment) or glob "
+            "patterns may be given, and are treated as a single experiment."))
     parser.add_argument("outfile",
         default="-",
         help="The file to which the output will be written, or - for stdout.")
@@ -36,15 +111,39 @@ def parse_args():
         )
     return parser.parse_args()
 
-def walklevel(some_dir, level=1):
-    some_dir = some_dir.rstrip(os.path.sep)
-    assert os.path.isdir(some_dir)
-    num_sep = some_dir.count(os.path.sep)
-    for root, dirs, files in os.walk(some_dir):
-        num_sep_this = root.count(os.path.sep)
-        yield root, dirs, files, (num_sep_this - num_sep)
-        if num_sep + level <= num_sep_this:
-            del dirs[:]
+def parse_shard(value):
+    try:
+        index, count = map(int, value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid shard: {value}")
+    if not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"invalid shard: {value}")
+    return index, count
+
+def parse_series_base(value):
+    try:
+        base = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid series base: {value}")
+    if not base > 1:
+        raise argparse.ArgumentTypeError("the series base must be above 1")
+    return base
+
+def campaign_shard(name, count):
+    # a stable hash, such that every machine agrees on the assignment
+    return zlib.crc32(name.encode()) % count
+
+def select_shard(campaigns, index, count, names=None):
+    if names is None:
+        names = {path: campaign_name(path) for path in campaigns}
+    return [path for path in campaigns
+        if campaign_shard(names[path], count) == index]
+
+def list_subdirs(path):
+    # scandir reports the entry type from the directory listing itself, so no
+    # extra stat is needed per entry on most filesystems
+    with os.scandir(path) as it:
+        return sorted(entry.name for entry in it if entry.is_dir())
 
 def path_split_last(path, n):
     sp = []
@@ -53,19 +152,227 @@ def path_split_last(path, n):
         sp = [tmp] + sp
     return (path, *sp)
 
-def find_campaigns(workdir):
+def campaign_name(path):
+    _, fuzzer, target, program, run = path_split_last(path, 4)
+    return f"{fuzzer}/{target}/{program}/{run}"
+
+def expand_workdirs(patterns):
+    workdirs = []
+    for pattern in patterns:
+        if glob.has_magic(pattern):
+            matches = sorted(x for x in glob.glob(pattern) if os.path.isdir(x))
+            if not matches:
+                logging.warning("%s does not match any workdir", pattern)
+            workdirs.extend(matches)
+        else:
+            workdirs.append(pattern)
+    # the same workdir given twice would count all its campaigns twice
+    return list(dict.fromkeys(os.path.realpath(x) for x in workdirs))
+
+def assign_campaign_names(campaigns):
+    """
+    Maps the paths of campaigns from one or more workdirs to unique
+    fuzzer/target/program/run names. The first campaign to use a run ID keeps
+    it, and every other campaign with the same name is given the lowest run ID
+    which is not taken yet, such that the runs of a program stay numbered
+    from 0 without gaps.
+    """
+    names = {}
+    taken = defaultdict(set)
+    duplicates = []
+    for path in campaigns:
+        _, fuzzer, target, program, run = path_split_last(path, 4)
+        if run in taken[fuzzer, target, program]:
+            duplicates.append(path)
+            continue
+        taken[fuzzer, target, program].add(run)
+        names[path] = f"{fuzzer}/{target}/{program}/{run}"
+    for path in duplicates:
+        _, fuzzer, target, program, run = path_split_last(path, 4)
+        runs = taken[fuzzer, target, program]
+        new_run = next(str(i) for i in range(len(runs) + 1)
+            if str(i) not in runs)
+        runs.add(new_run)
+        names[path] = f"{fuzzer}/{target}/{program}/{new_run}"
+        logging.info("%s is a duplicate run ID. Renamed to %s", path,
+            names[path])
+    return names
+
+def find_campaigns(workdir, subdir="ar"):
+    ar_dir = os.path.join(workdir, subdir)
+    assert os.path.isdir(ar_dir)
+    # only the fuzzer/target/program/run levels of the hierarchy are visited
+    for fuzzer in list_subdirs(ar_dir):
+        f_dir = os.path.join(ar_dir, fuzzer)
+        for target in list_subdirs(f_dir):
+            t_dir = os.path.join(f_dir, target)
+            for program in list_subdirs(t_dir):
+                p_dir = os.path.join(t_dir, program)
+                for run in list_subdirs(p_dir):
+                    # `run` directories always have integer-only names
+                    if not run.isdigit():
+                        logging.warning((
+                            "Detected invalid workdir hierarchy! Make sure to "
+                            "point the script to the root of the original "
+                            "workdir."
+                        ))
+                    yield os.path.join(p_dir, run)
+
+def read_manifest(path):
+    campaigns = {}
+    with open(path) as f:
+        for line in f:
+            try:
+                name, kind, size = line.rstrip('\n').split('\t')
+                campaigns[name] = (kind, int(size))
+            except ValueError:
+                logging.warning("Skipping malformed manifest entry: %r", line)
+    return campaigns
+
+def write_manifest(path, campaigns):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        for name, (kind, size) in sorted(campaigns.items()):
+            f.write(f"{name}\t{kind}\t{size}\n")
+    os.replace(tmp, path)
+
+def archived_entry(path):
+    """
+    Returns the manifest entry of the campaign at `path`, or None if it has not
+    been archived yet.
+    """
+    tarball = os.path.join(path, "ball.tar")
+    if os.path.isfile(tarball):
+        return ("tar", os.path.getsize(tarball))
+    elif os.path.isdir(os.path.join(path, "monitor")):
+        return ("dir", 0)
+    return None
+
+def check_manifest(workdir, manifest, campaigns):
+    """
+    Checks the campaigns read from a manifest against the ar dir. Tarballs
+    which are missing are dropped, and the ones whose size differs from the
+    recorded one are reported. Campaigns which were archived without being
+    added to the manifest (e.g., by older scripts, or before the manifest was
+    created) are added.
+    """
     ar_dir = os.path.join(workdir, "ar")
-    for root, dirs, _, level in walklevel(ar_dir, 3):
-        if level == 3:
-            for run in dirs:
-                # `run` directories always have integer-only names
-                if not run.isdigit():
-                    logging.warning((
-                        "Detected invalid workdir hierarchy! Make sure to point "
-                        "the script to the root of the original workdir."
-                    ))
-                path = os.path.join(root, run)
-                yield path
+    for name, (kind, size) in list(campaigns.items()):
+        if kind != "tar":
+            continue
+        tarball = os.path.join(ar_dir, *name.split("/"), "ball.tar")
+        try:
+            actual = os.path.getsize(tarball)
+        except OSError:
+            logging.warning("%s is in %s but missing. Skipping it", tarball,
+                manifest)
+            del campaigns[name]
+            continue
+        if actual != size:
+            logging.warning("%s has %d bytes instead of the %d in %s. It may "
+                "have been modified or be incomplete", tarball, actual, size,
+                manifest)
+
+    # only the directory levels are listed, which is cheap next to checking
+    # every campaign; only the unlisted ones are checked
+    unlisted = [path for path in find_campaigns(workdir)
+        if campaign_name(path) not in campaigns]
+    added = 0
+    for path in unlisted:
+        entry = archived_entry(path)
+        if entry is not None:
+            campaigns[campaign_name(path)] = entry
+            added += 1
+    if added:
+        logging.warning("%d archived campaigns in %s are missing from %s. "
+            "Including them anyway", added, ar_dir, manifest)
+    return campaigns
+
+def discover_campaigns(workdir, manifest=None, write=True, check=False):
+    """
+    Lists the paths to all archived campaigns in the workdir. If a manifest is
+    given and exists, campaigns are read from it instead of the filesystem,
+    and, if `check` is set, the manifest is checked against the ar dir.
+    Otherwise, the ar dir is scanned and, if `write` is set, the manifest is
+    written for next time.
+    """
+    if manifest is None:
+        return list(find_campaigns(workdir))
+
+    ar_dir = os.path.join(workdir, "ar")
+    if os.path.isfile(manifest):
+        campaigns = read_manifest(manifest)
+        logging.info("Loaded %d campaigns from %s", len(campaigns), manifest)
+        if check:
+            campaigns = check_manifest(workdir, manifest, campaigns)
+    else:
+        campaigns = {}
+        for path in find_campaigns(workdir):
+            entry = archived_entry(path)
+            if entry is None:
+                # the campaign has not finished yet
+                continue
+            campaigns[campaign_name(path)] = entry
+        if write:
+            write_manifest(manifest, campaigns)
+            logging.info("Wrote %d campaigns to %s", len(campaigns), manifest)
+    return [os.path.join(ar_dir, *name.split("/")) for name in campaigns]
+
+def discover_experiment(workdirs, manifests=None, write=True, check=False):
+    """
+    Lists the paths to all archived campaigns in every workdir, using the
+    corresponding manifest from `manifests`, if any.
+    """
+    if manifests is None:
+        manifests = [None] * len(workdirs)
+    campaigns = []
+    for workdir, manifest in zip(workdirs, manifests):
+        campaigns.extend(discover_campaigns(workdir, manifest, write, check))
+    return campaigns
+
+def campaign_fingerprint(path):
+    tarball = os.path.join(path, "ball.tar")
+    try:
+        if os.path.isfile(tarball):
+            st = os.stat(tarball)
+            return ["tar", st.st_size, st.st_mtime_ns]
+        timeline = os.path.join(path, TIMELINE_BASENAME)
+        if os.path.isfile(timeline):
+            st = os.stat(timeline)
+            return ["timeline", st.st_size, st.st_mtime_ns]
+        monitor = os.path.join(path, "monitor")
+        st = os.stat(monitor)
+        polls = [int(x) for x in os.listdir(monitor) if x.isdigit()]
+        return ["dir", len(polls), max(polls, default=-1), st.st_mtime_ns]
+    except OSError:
+        return None
+
+def load_cache(path):
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except ValueError:
+        logging.warning("Ignoring corrupted cache file %s", path)
+        return {}
+    if data.get("version") != CACHE_VERSION:
+        logging.info("Ignoring cache file %s from another version", path)
+        return {}
+    return data.get("campaigns", {})
+
+def save_cache(path, cache):
+    campaigns = {
+        name: entry for name, entry in cache.items()
+        if entry.get("fingerprint") is not None and "reached" in entry
+    }
+    data = json.dumps({"version": CACHE_VERSION, "campaigns": campaigns})
+    # write to a temporary file first so that an interrupted run does not
+    # leave behind a truncated cache
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        f.write(data)
+    os.replace(tmp, path)
 
 def ensure_dir(path):
     try:
@@ -88,35 +395,78 @@ def clear_dir(path):
 def extract_monitor_dumps(tarball, dest):
     clear_dir(dest)
     # get the path to the monitor dir inside the tarball
-    monitor = subprocess.check_output(f'tar -tf "{tarball}" | grep -Po ".*monitor" | uniq', shell=True)
+    monitor = subprocess.check_output(f'tar -tf "{tarball}" | grep -Po ".*monitor" | head -n1', shell=True)
     monitor = monitor.decode().rstrip()
     # strip all path components until and excluding the monitor dir
     ccount = len(monitor.split("/")) - 1
-    os.system(f'tar -xf "{tarball}" --strip-components={ccount} -C "{dest}" {monitor}')
-
-def generate_monitor_df(dumpdir, campaign):
-    def row_generator():
-        files = os.listdir(dumpdir)
-        if 'tmp' in files:
-            files.remove('tmp')
-        files.sort(key=int)
-        for timestamp in files:
-            fname = os.path.join(dumpdir, timestamp)
-            try:
-                with open(fname, newline='') as csvfile:
-                    reader = csv.DictReader(csvfile)
-                    row = next(reader)
-                    row['TIME'] = timestamp
-                    yield row
-            except StopIteration:
-                logging.debug((
-                    "Truncated monitor file contains no rows!"
-                ))
+    # the wildcard also matches the timeline file next to the monitor dir
+    os.system(f'tar -xf "{tarball}" --strip-components={ccount} -C "{dest}" --wildcards "{monitor}*"')
+
+def read_monitor_dumps(root):
+    timeline = os.path.join(root, TIMELINE_BASENAME)
+    if os.path.isfile(timeline):
+        with open(timeline, 'rb') as f:
+            yield from read_timeline(f.read())
+        return
+
+    dumpdir = os.path.join(root, "monitor")
+    for timestamp in os.listdir(dumpdir):
+        # skip the `tmp` file of an in-progress poll
+        if not timestamp.isdigit():
+            continue
+        with open(os.path.join(dumpdir, timestamp), 'rb') as f:
+            yield timestamp, f.read()
+
+def stream_monitor_dumps(tarball):
+    # tarballs are read sequentially, so only a single pass over the archive
+    # is needed and nothing is written to disk
+    with tarfile.open(tarball, "r|*") as tar:
+        for member in tar:
+            if not member.isfile():
+                continue
+            parent, timestamp = os.path.split(member.name)
+            if timestamp == TIMELINE_BASENAME:
+                yield from read_timeline(tar.extractfile(member).read())
                 continue
+            if os.path.basename(parent) != "monitor" or not timestamp.isdigit():
+                continue
+            yield timestamp, tar.extractfile(member).read()
+
+def generate_monitor_df(dumps, campaign):
+    dumps = sorted(dumps, key=lambda x: int(x[0]))
 
-    # use a list in case pd.DataFrame() can pre-allocate ahead of time
-    rows = list(row_generator())
-    if len(rows) == 0:
+    # polls are grouped into batches of consecutive rows which share the same
+    # header, such that each batch can be parsed by numpy in one go
+    columns = {}
+    batches = []
+    times = np.empty(len(dumps), dtype=np.int64)
+    nrows = 0
+    header = None
+    for timestamp, data in dumps:
+        line, _, row = data.partition(b'\n')
+        row = row.partition(b'\n')[0]
+        if not row:
+            logging.debug((
+                "Truncated monitor file contains no rows!"
+            ))
+            continue
+        if line != header:
+            header = line
+            names = line.decode().rstrip('\r').split(',')
+            for name in names:
+                columns.setdefault(name, len(columns))
+            batch = (np.array([columns[x] for x in names], dtype=np.intp), [])
+            batches.append(batch)
+        if row.count(b',') != len(batch[0]) - 1:
+            logging.debug((
+                "Malformed monitor file at %s does not match its header!"
+            ), timestamp)
+            continue
+        batch[1].append(row)
+        times[nrows] = int(timestamp)
+        nrows += 1
+
+    if nrows == 0:
         workdir, _, fuzzer, target, program, run = path_split_last(campaign, 5)
         name = f"{fuzzer}/{target}/{program}/{run}"
         logfile = os.path.join(workdir, "log",
@@ -125,95 +475,494 @@ def generate_monitor_df(dumpdir, campaign):
             "%s contains no monitor logs. Check the corresponding campaign "
             "log file for more information: %s", name, logfile
         )
+        return None
 
-    df = pd.DataFrame(rows)
-    df.set_index('TIME', inplace=True)
-    df.fillna(0, inplace=True)
-    df = df.astype(int)
-    del rows
-    return df
+    # canaries missing from a poll's header have not been reached yet
+    matrix = np.zeros((nrows, len(columns)), dtype=np.uint64)
+    start = 0
+    for indices, rows in batches:
+        values = np.fromstring(b','.join(rows), dtype=np.uint64, sep=',')
+        matrix[start:start + len(rows), indices] = \
+            values.reshape(len(rows), len(indices))
+        start += len(rows)
 
-def process_one_campaign(path):
-    logging.info("Processing %s", path)
-    _, fuzzer, target, program, run = path_split_last(path, 4)
+    index = pd.Index(times[:nrows], name='TIME')
+    return pd.DataFrame(matrix, index=index, columns=list(columns))
+
+def timeline_path(outdir, fuzzer, target, program, run):
+    return os.path.join(outdir, f"fuzzer={fuzzer}", f"target={target}",
+        f"program={program}", f"{run}.parquet")
+
+def write_timeline(df, path, run):
+    # timelines are stored in long format, with one row per poll and canary,
+    # such that all campaigns share the same schema. Rows where a canary has
+    # not yet been reached are left out.
+    bugs = list(dict.fromkeys(x[:-2] for x in df.columns))
+    values = df.to_numpy()
+    counters = {}
+    for metric in ('R', 'T'):
+        counters[metric] = np.zeros((len(df), len(bugs)), dtype=np.uint64)
+        for i, bug in enumerate(bugs):
+            if f"{bug}_{metric}" in df.columns:
+                counters[metric][:, i] = \
+                    values[:, df.columns.get_loc(f"{bug}_{metric}")]
+    polls, canaries = np.nonzero((counters['R'] > 0) | (counters['T'] > 0))
 
+    table = pa.table({
+        'run': pa.array(np.full(len(polls), int(run), dtype=np.uint16)),
+        'time': pa.array(df.index.to_numpy()[polls].astype(np.uint32)),
+        'bug': pa.DictionaryArray.from_arrays(
+            pa.array(canaries.astype(np.int32)), pa.array(bugs)),
+        'reached': pa.array(counters['R'][polls, canaries]),
+        'triggered': pa.array(counters['T'][polls, canaries]),
+    })
+    ensure_dir(os.path.dirname(path))
+    tmp = f"{path}.tmp"
+    pq.write_table(table, tmp, compression='zstd')
+    os.replace(tmp, path)
+
+def load_monitor_dumps(path, tmpdir=None):
     tarball = os.path.join(path, "ball.tar")
-    istarball = False
-    if os.path.isfile(tarball):
-        istarball = True
+    if os.path.isfile(tarball) and tmpdir is not None:
         dumpdir = mkdtemp(dir=tmpdir)
         logging.debug("Campaign is tarballed. Extracting to %s", dumpdir)
-        extract_monitor_dumps(tarball, dumpdir)
+        try:
+            extract_monitor_dumps(tarball, dumpdir)
+            return list(read_monitor_dumps(dumpdir))
+        finally:
+            clear_dir(dumpdir)
+            os.rmdir(dumpdir)
+    elif os.path.isfile(tarball):
+        logging.debug("Campaign is tarballed. Streaming %s", tarball)
+        return list(stream_monitor_dumps(tarball))
     else:
-        dumpdir = path
+        return list(read_monitor_dumps(path))
 
-    df = None
+def read_one_campaign(path, tmpdir):
+    """
+    The I/O stage of the pipeline: reads the raw monitor dumps of a campaign,
+    which are then parsed by process_one_campaign in a worker process.
+    """
+    stats = {}
+    start = time.perf_counter()
     try:
-        df = generate_monitor_df(os.path.join(dumpdir, "monitor"), path)
+        dumps = load_monitor_dumps(path, tmpdir)
+    except Exception as ex:
+        logging.exception("Encountered exception when reading %s. Details: "
+            "%s", path, ex)
+        dumps = None
+    stats["extract"] = time.perf_counter() - start
+    return path, dumps, stats
+
+def process_one_campaign(path, name=None, dumps=None, stats=None):
+    logging.info("Processing %s", path)
+    if name is None:
+        name = campaign_name(path)
+    fuzzer, target, program, run = name.split("/")
+    stats = dict(stats or {}, pid=os.getpid(), start=time.time())
+    tick = time.perf_counter()
+
+    def lap(phase):
+        nonlocal tick
+        now = time.perf_counter()
+        stats[phase] = now - tick
+        tick = now
+
+    summary = None
+    try:
+        if dumps is None:
+            dumps = load_monitor_dumps(path, tmpdir)
+            lap("extract")
+        stats["polls"] = len(dumps)
+        stats["bytes"] = sum(len(data) for _, data in dumps)
+
+        df = generate_monitor_df(dumps, path)
+        del dumps
+        lap("parse")
+        if df is not None:
+            reached, triggered = get_ttb_from_df(df)
+            lap("ttb")
+            summary = {
+                "reached": reached,
+                "triggered": triggered
+            }
+            if series_base is not None:
+                summary["series"] = get_series_from_df(df, series_base)
+                lap("series")
     except Exception as ex:
-        name = f"{fuzzer}/{target}/{program}/{run}"
         logging.exception("Encountered exception when processing %s. Details: "
-            "%s", name, ex)
-    finally:
-        if istarball:
-            clear_dir(dumpdir)
-            os.rmdir(dumpdir)
-    return fuzzer, target, program, run, df
+            "%s", path, ex)
+        df = None
+
+    # a failed export must not cost the campaign its summary
+    if df is not None and timelines is not None:
+        try:
+            write_timeline(df, timeline_path(timelines,
+                fuzzer, target, program, run), run)
+            lap("timeline")
+        except Exception as ex:
+            logging.exception("Failed to write the timeline of %s. Details: "
+                "%s", path, ex)
+    stats["end"] = time.time()
+    # only the summary is sent back to the parent, not the whole timeline
+    return name, summary, stats
+
+def process_campaign_task(task):
+    return process_one_campaign(*task)
+
+def pipeline_results(pool, campaigns, names, io_threads, prefetch, tmpdir):
+    """
+    Reads campaigns in a pool of I/O threads and hands their dumps over to the
+    process pool for parsing. At most `prefetch` campaigns are in flight at any
+    time. Yields the results of process_one_campaign in completion order.
+    """
+    results = queue.Queue()
+    pending = iter(campaigns)
 
-def collect_experiment_data(workdir, workers):
+    def dispatch(future):
+        path, dumps, stats = future.result()
+        if dumps is None:
+            # reading failed; report the campaign as omitted. It was never
+            # processed by a worker, so it has no pid
+            results.put((names[path], None,
+                dict(stats, pid=None, start=time.time(), end=time.time())))
+            return
+        # the campaign only waits in the pool's queue from now on
+        stats["submit"] = time.time()
+        pool.apply_async(process_one_campaign,
+            (path, names[path], dumps, stats),
+            callback=results.put, error_callback=results.put)
+
+    def read_next(executor):
+        path = next(pending, None)
+        if path is not None:
+            executor.submit(read_one_campaign, path, tmpdir) \
+                .add_done_callback(dispatch)
+
+    with ThreadPoolExecutor(max_workers=io_threads) as executor:
+        for _ in range(prefetch):
+            read_next(executor)
+        for _ in range(len(campaigns)):
+            result = results.get()
+            if isinstance(result, BaseException):
+                raise result
+            # a campaign left the pipeline, so another one can be read
+            read_next(executor)
+            yield result
+
+def summarise_pool_stats(campaigns, workers, wall_time):
+    # campaigns whose reading failed never reached a worker
+    processed = [stats for stats in campaigns if stats["pid"] is not None]
+    busy = defaultdict(float)
+    for stats in processed:
+        busy[stats["pid"]] += stats["end"] - stats["start"]
+    waits = [stats["queue_wait"] for stats in processed] or [0]
+    totals = {}
+    for key in ("extract", "parse", "timeline", "ttb", "series", "polls",
+            "bytes"):
+        totals[key] = sum(stats.get(key, 0) for stats in campaigns)
+    return {
+        "workers": workers,
+        "wall_time": wall_time,
+        # the fraction of the pool's lifetime that workers spent processing
+        "utilisation": sum(busy.values()) / (workers * wall_time) \
+            if wall_time > 0 else 0,
+        "busy": {str(pid): t for pid, t in busy.items()},
+        "queue_wait": {
+            "mean": sum(waits) / len(waits),
+            "max": max(waits)
+        },
+        "totals": totals
+    }
+
+def collect_experiment_data(workdir, workers, extract=False, cache=None,
+        timelines=None, campaigns=None, stats=None, io_threads=0,
+        prefetch=None, names=None, series=None):
+    """
+    Processes all campaigns and returns the summary of their results. If
+    `series` is given, it is filled with the downsampled counter series of all
+    campaigns, sampled at the powers of series["base"].
+    """
     def init(*args):
-        global tmpdir
-        tmpdir, = tuple(args)
+        global tmpdir, timelines, series_base
+        tmpdir, timelines, series_base = tuple(args)
 
-    experiment = ddr()
-    tmpdir = os.path.join(workdir, "tmp")
-    ensure_dir(tmpdir)
+    summary = ddr()
+    series_base = series["base"] if series is not None else None
+    series_data = ddr()
+    if extract:
+        tmpdir = os.path.join(workdir, "tmp")
+        ensure_dir(tmpdir)
+    else:
+        # tarballs are streamed in-process; no temporary directory is needed
+        tmpdir = None
 
-    with Pool(processes=workers, initializer=init, initargs=(tmpdir,)) as pool:
-        results = pool.starmap(process_one_campaign,
-            ((path,) for path in find_campaigns(workdir))
-        )
-        for fuzzer, target, program, run, df in results:
-            if df is not None:
-                experiment[fuzzer][target][program][run] = df
+    if campaigns is None:
+        campaigns = list(find_campaigns(workdir))
+    if names is None:
+        names = {path: campaign_name(path) for path in campaigns}
+    paths = campaigns
+    campaigns = []
+    seen = set()
+    for path in paths:
+        if cache is None:
+            campaigns.append(path)
+            continue
+        name = names[path]
+        fuzzer, target, program, run = name.split("/")
+        seen.add(name)
+        fingerprint = campaign_fingerprint(path)
+        entry = cache.get(name, {})
+        # with several workdirs, a name may map to another campaign next time
+        if fingerprint is not None and entry.get("fingerprint") == fingerprint \
+                and entry.get("path") == path \
+                and "reached" in entry and (timelines is None or os.path.isfile(
+                    timeline_path(timelines, fuzzer, target, program, run))) \
+                and (series_base is None or
+                    entry.get("series_base") == series_base):
+            logging.debug("%s is unchanged. Using cached summary", name)
+            summary[fuzzer][target][program][run] = {
+                "reached": entry["reached"],
+                "triggered": entry["triggered"]
+            }
+            if series_base is not None:
+                series_data[fuzzer][target][program][run] = entry["series"]
+        else:
+            cache[name] = {"fingerprint": fingerprint, "path": path}
+            campaigns.append(path)
+    if cache is not None:
+        # forget about campaigns which no longer exist
+        for name in cache.keys() - seen:
+            del cache[name]
+        logging.info("%d campaigns served from cache, %d to be processed",
+            len(seen) - len(campaigns), len(campaigns))
+
+    campaign_stats = []
+    pool_start = time.time()
+    with Pool(processes=workers, initializer=init,
+            initargs=(tmpdir, timelines, series_base)) as pool:
+        # results are merged as soon as they arrive, in completion order
+        if io_threads > 0:
+            results = pipeline_results(pool, campaigns, names, io_threads,
+                prefetch or 2 * workers, tmpdir)
+        else:
+            results = pool.imap_unordered(process_campaign_task,
+                [(path, names[path]) for path in campaigns])
+        for done, (name, r_data, c_stats) in enumerate(results, start=1):
+            fuzzer, target, program, run = name.split("/")
+            if stats is not None:
+                c_stats["campaign"] = name
+                if c_stats["pid"] is not None:
+                    # without I/O threads, all campaigns are queued as soon as
+                    # the pool starts
+                    c_stats["queue_wait"] = c_stats["start"] - \
+                        c_stats.get("submit", pool_start)
+                c_stats["received"] = time.time()
+                campaign_stats.append(c_stats)
+            if r_data is not None:
+                if cache is not None:
+                    cache[name].update(r_data)
+                    if series_base is not None:
+                        cache[name]["series_base"] = series_base
+                if series_base is not None:
+                    series_data[fuzzer][target][program][run] = \
+                        r_data.pop("series")
+                summary[fuzzer][target][program][run] = r_data
             else:
-                # TODO add an empty df so that the run is accounted for
-                name = f"{fuzzer}/{target}/{program}/{run}"
+                # TODO add an empty summary so that the run is accounted for
                 logging.warning("%s has been omitted!", name)
-    return experiment
+            logging.info("Processed %d/%d campaigns", done, len(campaigns))
+    if stats is not None:
+        stats["cached"] = len(seen) - len(campaigns) if cache is not None else 0
+        stats["campaigns"] = campaign_stats
+        stats["pool"] = summarise_pool_stats(campaign_stats, workers,
+            time.time() - pool_start)
+    if series is not None:
+        series_data = default_to_regular(series_data)
+        length = max((len(counts) for f_data in series_data.values()
+            for t_data in f_data.values() for p_data in t_data.values()
+            for r_data in p_data.values() for metric in r_data.values()
+            for counts in metric.values()), default=0)
+        series["times"] = list(itertools.islice(iter_series_times(
+            series_base), length))
+        series["results"] = series_data
+    return default_to_regular(summary)
 
 def get_ttb_from_df(df):
     reached = {}
     triggered = {}
 
-    bugs = set(x[:-2] for x in df.columns)
-    logging.debug("Bugs found: %s", bugs)
-    for bug in bugs:
-        R = df[df[f"{bug}_R"] > 0]
-        if not R.empty:
-            reached[bug] = int(R.index[0])
-        T = df[df[f"{bug}_T"] > 0]
-        if not T.empty:
-            triggered[bug] = int(T.index[0])
+    logging.debug("Bugs found: %s", set(x[:-2] for x in df.columns))
+    if df.empty:
+        return reached, triggered
+
+    # the index of the first poll where each counter is non-zero, computed for
+    # all columns at once, or -1 if the counter never becomes non-zero
+    mask = df.to_numpy() > 0
+    first = np.where(mask.any(axis=0), mask.argmax(axis=0), -1)
+    hit = first >= 0
+    times = df.index.to_numpy()
+    for column, idx in zip(df.columns[hit], first[hit]):
+        bug, metric = column[:-2], column[-1]
+        if metric == 'R':
+            reached[bug] = int(times[idx])
+        elif metric == 'T':
+            triggered[bug] = int(times[idx])
     return reached, triggered
 
+def iter_series_times(base):
+    """
+    Yields the sample times of the downsampled series, i.e., the powers of
+    `base` rounded up to whole seconds, without duplicates.
+    """
+    last = 0
+    for k in itertools.count():
+        t = math.ceil(base ** k)
+        if t > last:
+            yield t
+            last = t
+
+def get_series_from_df(df, base):
+    """
+    Samples the reached and triggered counters of every bug at the times given
+    by iter_series_times, up to the last poll of the campaign. Bugs whose
+    counter is zero throughout are left out.
+    """
+    reached = {}
+    triggered = {}
+    if df.empty:
+        return {"reached": reached, "triggered": triggered}
+
+    index = df.index.to_numpy()
+    times = np.fromiter(itertools.takewhile(lambda t: t <= index[-1],
+        iter_series_times(base)), dtype=np.int64)
+    # the counters are cumulative, so every sample holds the value of the
+    # last poll at or before the sample time, and zero before the first poll
+    polls = np.searchsorted(index, times, side='right') - 1
+    values = df.to_numpy()[np.maximum(polls, 0)]
+    values[polls < 0] = 0
+    nonzero = values.any(axis=0)
+    for column, counts in zip(df.columns[nonzero], values.T[nonzero]):
+        bug, metric = column[:-2], column[-1]
+        if metric == 'R':
+            reached[bug] = counts.tolist()
+        elif metric == 'T':
+            triggered[bug] = counts.tolist()
+    return {"reached": reached, "triggered": triggered}
+
+def follow_live_campaign(path, state):
+    """
+    Parses the polls of a running campaign which were recorded since the last
+    call, and merges them into the reached/triggered times kept in `state`.
+    """
+    timeline = os.path.join(path, TIMELINE_BASENAME)
+    if os.path.isfile(timeline):
+        if "follower" not in state:
+            state["follower"] = TimelineFollower(timeline)
+        dumps = state["follower"].read()
+    else:
+        dumpdir = os.path.join(path, "monitor")
+        last = state.get("last", -1)
+        dumps = []
+        for timestamp in os.listdir(dumpdir) if os.path.isdir(dumpdir) else ():
+            if not timestamp.isdigit() or int(timestamp) <= last:
+                continue
+            with open(os.path.join(dumpdir, timestamp), 'rb') as f:
+                dumps.append((timestamp, f.read()))
+        if dumps:
+            state["last"] = max(int(x[0]) for x in dumps)
+
+    reached = state.setdefault("reached", {})
+    triggered = state.setdefault("triggered", {})
+    if not dumps:
+        return
+    df = generate_monitor_df(dumps, path)
+    if df is None:
+        return
+    # new polls are always later than the ones already read, so only bugs
+    # which have not been seen yet need to be recorded
+    r, t = get_ttb_from_df(df)
+    for bug, ttb in r.items():
+        reached.setdefault(bug, ttb)
+    for bug, ttb in t.items():
+        triggered.setdefault(bug, ttb)
+
+def follow_experiment(workdirs, outfile, workers, interval, extract=False,
+        cache=None, timelines=None, cachefile=None, manifests=None,
+        check_manifests=False):
+    live = {}
+    if cache is None:
+        # finished campaigns are still only processed once
+        cache = {}
+    if manifests is None:
+        manifests = [None] * len(workdirs)
+    while True:
+        start = time.monotonic()
+
+        live_paths = []
+        finished = []
+        for workdir, manifest in zip(workdirs, manifests):
+            # campaigns which are still running live in the cache dir, until
+            # they are archived into the ar dir and removed
+            running = set()
+            if os.path.isdir(os.path.join(workdir, "cache")):
+                for path in find_campaigns(workdir, "cache"):
+                    live_paths.append(path)
+                    running.add(campaign_name(path))
+
+            # a manifest written from a scan would miss campaigns finishing
+            # later, so it is only used if it is kept up to date by the captain
+            # scripts
+            for path in discover_campaigns(workdir, manifest, write=False,
+                    check=check_manifests):
+                if campaign_name(path) not in running:
+                    finished.append(path)
+        for path in live.keys() - set(live_paths):
+            del live[path]
+
+        names = assign_campaign_names(finished + live_paths)
+        summary = collect_experiment_data(workdirs[0], workers, extract, cache,
+            timelines, finished, names=names)
+        if cachefile is not None:
+            save_cache(cachefile, cache)
+
+        for path in live_paths:
+            state = live.setdefault(path, {})
+            try:
+                follow_live_campaign(path, state)
+            except Exception as ex:
+                logging.exception("Encountered exception when following %s. "
+                    "Details: %s", path, ex)
+                continue
+            fuzzer, target, program, run = names[path].split("/")
+            summary.setdefault(fuzzer, {}).setdefault(target, {}) \
+                .setdefault(program, {})[run] = {
+                "reached": state["reached"],
+                "triggered": state["triggered"]
+            }
+
+        write_output({'results': summary}, outfile)
+        logging.info("Updated %s with %d finished and %d live campaigns",
+            outfile, len(finished), len(live_paths))
+        time.sleep(max(0, interval - (time.monotonic() - start)))
+
 def default_to_regular(d):
     if isinstance(d, defaultdict):
         d = {k: default_to_regular(v) for k, v in d.items()}
     return d
 
-def get_experiment_summary(experiment):
-    summary = ddr()
-    for fuzzer, f_data in experiment.items():
-        for target, t_data in f_data.items():
-            for program, p_data in t_data.items():
-                for run, df in p_data.items():
-                    reached, triggered = get_ttb_from_df(df)
-                    summary[fuzzer][target][program][run] = {
-                        "reached": reached,
-                        "triggered": triggered
-                    }
-    return default_to_regular(summary)
+def write_output(output, outfile):
+    # results are merged in completion order, but the same experiment must
+    # always give the same bytes
+    data = json.dumps(output, sort_keys=True).encode()
+    if outfile == "-":
+        sys.stdout.buffer.write(data)
+    else:
+        # readers of a followed output file never see a partial summary
+        tmp = f"{outfile}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, outfile)
 
 def configure_verbosity(level):
     mapping = {
@@ -228,20 +977,80 @@ def configure_verbosity(level):
 def main():
     args = parse_args()
     configure_verbosity(args.verbose)
-    experiment = collect_experiment_data(args.workdir, int(args.workers))
-    summary = get_experiment_summary(experiment)
+    if args.timelines is not None and pa is None:
+        logging.error("pyarrow is required for --timelines "
+            "(pip install pyarrow)")
+        sys.exit(1)
+    workdirs = expand_workdirs(args.workdirs)
+    if not workdirs:
+        logging.error("No workdir found")
+        sys.exit(1)
+    cache = None
+    if args.cache:
+        cachefile = args.cache_file or \
+            os.path.join(workdirs[0], CACHE_BASENAME)
+        cache = load_cache(cachefile)
+    manifests = None
+    if args.manifest:
+        if args.manifest_file is not None and len(workdirs) > 1:
+            logging.error("--manifest-file cannot be used with several "
+                "workdirs")
+            sys.exit(1)
+        manifests = [args.manifest_file] if args.manifest_file else \
+            [os.path.join(x, MANIFEST_BASENAME) for x in workdirs]
+    if args.follow:
+        if args.outfile == "-":
+            logging.error("--follow requires an output file")
+            sys.exit(1)
+        if args.shard is not None:
+            logging.error("--shard cannot be combined with --follow")
+            sys.exit(1)
+        if args.series:
+            logging.error("--series cannot be combined with --follow")
+            sys.exit(1)
+        try:
+            follow_experiment(workdirs, args.outfile, int(args.workers),
+                args.interval, args.extract, cache, args.timelines,
+                cachefile if cache is not None else None, manifests,
+                args.check_manifest)
+        except KeyboardInterrupt:
+            pass
+        return
+
+    stats = {} if args.stats else None
+    series = {"base": args.series_base} if args.series else None
+    start = time.perf_counter()
+    campaigns = discover_experiment(workdirs, manifests,
+        check=args.check_manifest)
+    # run IDs are made unique before sharding, so that every machine agrees on
+    # the names of the campaigns
+    names = assign_campaign_names(campaigns)
+    if args.shard is not None:
+        campaigns = select_shard(campaigns, *args.shard, names)
+        logging.info("Shard %d/%d has %d campaigns", *args.shard,
+            len(campaigns))
+    if stats is not None:
+        stats["discovery"] = time.perf_counter() - start
+    summary = collect_experiment_data(workdirs[0], int(args.workers),
+        args.extract, cache, args.timelines, campaigns, stats,
+        args.io_threads, args.prefetch, names, series)
+    if stats is not None:
+        stats["total"] = time.perf_counter() - start
+        with open(args.stats, "w") as f:
+            json.dump(stats, f, indent=2)
+    if cache is not None:
+        save_cache(cachefile, cache)
 
     output = {
         'results': summary,
         # TODO add configuration options and other experiment parameters
     }
-
-    data = json.dumps(output).encode()
-    if args.outfile == "-":
-        sys.stdout.buffer.write(data)
-    else:
-        with open(args.outfile, "wb") as f:
-            f.write(data)
+    if args.shard is not None:
+        output['shard'] = dict(zip(("index", "count"), args.shard))
+    if series is not None:
+        # kept apart from the results, where every key of a run is a metric
+        output['series'] = series
+    write_output(output, args.outfile)
 
 if __name__ == '__main__':
     main()
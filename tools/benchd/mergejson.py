@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import logging
+import sys
+
+from exp2json import configure_verbosity, write_output
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=(
+        "Merges the partial summaries produced by exp2json (e.g., with --shard "
+        "on several machines) into a single summary."
+    ))
+    parser.add_argument("-o", "--outfile",
+        default="-",
+        help="The file to which the output will be written, or - for stdout.")
+    parser.add_argument("--allow-missing-shards", action="store_true",
+        help="Do not fail when some shards of a sharded run are missing.")
+    parser.add_argument("summaries", nargs="+",
+        help="The JSON summaries to merge.")
+    parser.add_argument('-v', '--verbose', action='count', default=0,
+        help=("Controls the verbosity of messages. "
+            "-v prints info. -vv prints debug. Default: warnings and higher.")
+        )
+    return parser.parse_args()
+
+def merge_results(merged, results, origin, origins):
+    """
+    Merges the `results` of one summary into `merged`. Returns the names of
+    runs which are present in both with different data.
+    """
+    conflicts = []
+    for fuzzer, f_data in results.items():
+        for target, t_data in f_data.items():
+            for program, p_data in t_data.items():
+                m_data = merged.setdefault(fuzzer, {}) \
+                               .setdefault(target, {}) \
+                               .setdefault(program, {})
+                for run, r_data in p_data.items():
+                    name = f"{fuzzer}/{target}/{program}/{run}"
+                    if run not in m_data:
+                        m_data[run] = r_data
+                        origins[name] = origin
+                    elif m_data[run] == r_data:
+                        logging.warning("%s is duplicated in %s and %s",
+                            name, origins[name], origin)
+                    else:
+                        logging.error("%s differs between %s and %s",
+                            name, origins[name], origin)
+                        conflicts.append(name)
+    return conflicts
+
+def merge_series(series, filenames):
+    """
+    Merges the downsampled series of all summaries, which must have been
+    sampled with the same base. Returns None if they cannot be merged.
+    """
+    missing = [f for f, x in zip(filenames, series) if x is None]
+    if missing:
+        logging.warning("Dropping series, which are missing from: %s",
+            ", ".join(missing))
+        return None
+    bases = set(x['base'] for x in series)
+    if len(bases) > 1:
+        logging.warning("Dropping series with different bases: %s",
+            sorted(bases))
+        return None
+    merged = {}
+    origins = {}
+    for filename, x in zip(filenames, series):
+        # conflicting runs have already been reported with the results
+        merge_results(merged, x['results'], filename, origins)
+    # the sample times of a shorter series are a prefix of the longer ones
+    times = max((x['times'] for x in series), key=len)
+    return {'base': bases.pop(), 'times': times, 'results': merged}
+
+def check_shards(shards, allow_missing):
+    counts = set(count for _, count in shards.values())
+    if len(counts) > 1:
+        logging.error("Summaries come from different shard counts: %s",
+            sorted(counts))
+        return False
+    count, = counts
+    seen = {}
+    for filename, (index, _) in shards.items():
+        if index in seen:
+            logging.warning("Shard %d/%d is in both %s and %s",
+                index, count, seen[index], filename)
+        seen[index] = filename
+    missing = sorted(set(range(count)) - seen.keys())
+    if missing:
+        log = logging.warning if allow_missing else logging.error
+        log("Missing shards (out of %d): %s", count, missing)
+        return allow_missing
+    return True
+
+def main():
+    args = parse_args()
+    configure_verbosity(args.verbose)
+
+    merged = {}
+    origins = {}
+    shards = {}
+    conflicts = []
+    series = []
+    for filename in args.summaries:
+        with open(filename) as f:
+            summary = json.load(f)
+        if 'shard' in summary:
+            shards[filename] = (summary['shard']['index'],
+                                summary['shard']['count'])
+        conflicts += merge_results(merged, summary.get('results', {}),
+            filename, origins)
+        series.append(summary.get('series'))
+
+    if conflicts:
+        logging.error("%d runs have conflicting results. Aborting.",
+            len(conflicts))
+        sys.exit(1)
+    if shards and not check_shards(shards, args.allow_missing_shards):
+        sys.exit(1)
+
+    output = {'results': merged}
+    if any(x is not None for x in series):
+        merged_series = merge_series(series, args.summaries)
+        if merged_series is not None:
+            output['series'] = merged_series
+
+    logging.info("Merged %d runs from %d summaries", len(origins),
+        len(args.summaries))
+    write_output(output, args.outfile)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+"""
+Streaming reader for the JSON summaries produced by exp2json.py.
+
+The results section is walked incrementally, fuzzer -> target -> program ->
+run -> metric -> bug, and flattened into one (fuzzer, target, program, run,
+metric, bug, time) record per time-to-bug. When ijson is installed, the summary
+is parsed as a stream, such that the nested dictionaries of the whole summary
+never need to be held in memory at once. Otherwise, it falls back to json.load,
+which yields the same records. ijson (>= 3.1) is listed in the report_df
+requirements; install it for survival_analysis.py too on large summaries.
+
+Records can be filtered on the value of any field as they are read, such that
+the subtrees of the rejected fuzzers, targets, etc. are skipped as a whole.
+"""
+
+from array import array
+import json
+import logging
+from typing import Collection, Dict, Iterable, Iterator, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+RECORD_FIELDS = ('fuzzer', 'target', 'program', 'run', 'metric', 'bug')
+Record = Tuple[str, str, str, str, str, str, int]
+# the accepted values of some of the record fields
+Filters = Dict[str, Collection[str]]
+
+
+def iter_records(path: str, sections: Iterable[str] = (),
+                 extras: Optional[dict] = None,
+                 filters: Optional[Filters] = None) -> Iterator[Record]:
+    """
+    Yield the flat records of the results section of the summary at `path`.
+    The other top-level `sections` (e.g., config) are stored in `extras`, if
+    present in the summary. With `filters`, only the records whose fields have
+    one of the accepted values are yielded.
+    """
+    sections = set(sections)
+    if extras is None:
+        extras = {}
+    # the accepted values at every depth of the results, None if all are
+    accepted = [None] * len(RECORD_FIELDS)
+    for field, values in (filters or {}).items():
+        accepted[RECORD_FIELDS.index(field)] = set(values)
+    with open(path, 'rb') as f:
+        if ijson is None:
+            yield from _iter_records_json(f, sections, extras, accepted)
+        else:
+            yield from _iter_records_ijson(f, sections, extras, accepted)
+
+
+def _iter_records_json(f, sections: set, extras: dict,
+                       accepted: list) -> Iterator[Record]:
+    logging.info("ijson is not installed. Loading the whole summary "
+                 "(pip install ijson)")
+    data = json.load(f)
+    for name in sections & data.keys():
+        extras[name] = data[name]
+
+    def items(d, depth):
+        if accepted[depth] is None:
+            return d.items()
+        return ((k, v) for k, v in d.items() if k in accepted[depth])
+
+    for fuzzer, f_data in items(data.get('results', {}), 0):
+        for target, t_data in items(f_data, 1):
+            for program, p_data in items(t_data, 2):
+                for run, r_data in items(p_data, 3):
+                    for metric, m_data in items(r_data, 4):
+                        for bug, time in items(m_data, 5):
+                            yield fuzzer, target, program, run, metric, bug, time
+
+
+def _iter_records_ijson(f, sections: set, extras: dict,
+                        accepted: list) -> Iterator[Record]:
+    # the key of every enclosing map, from the top-level one inwards
+    keys = []
+    pending = None
+    builder = None
+    depth = 0
+    # the depth of the innermost rejected key, whose subtree is skipped
+    rejected = None
+    for event, value in ijson.basic_parse(f, use_float=True):
+        if pending is not None and builder is None:
+            builder = ijson.ObjectBuilder()
+        if builder is not None:
+            # build the value of a requested top-level section as a whole
+            builder.event(event, value)
+            if event in ('start_map', 'start_array'):
+                depth += 1
+            elif event in ('end_map', 'end_array'):
+                depth -= 1
+            if depth == 0:
+                extras[pending] = builder.value
+                pending = builder = None
+            continue
+
+        if event == 'map_key':
+            keys[-1] = value
+            if rejected is not None and len(keys) > rejected:
+                continue
+            rejected = None
+            if len(keys) == 1 and value in sections:
+                pending = value
+            elif 1 < len(keys) <= 7 and keys[0] == 'results':
+                values = accepted[len(keys) - 2]
+                if values is not None and value not in values:
+                    rejected = len(keys)
+        elif event == 'start_map':
+            keys.append(None)
+        elif event == 'end_map':
+            keys.pop()
+        elif event == 'number' and len(keys) == 7 and keys[0] == 'results' \
+                and rejected is None:
+            yield (*keys[1:], value)
+
+
+def read_records(path: str, sections: Iterable[str] = (),
+                 extras: Optional[dict] = None,
+                 filters: Optional[Filters] = None) -> pd.DataFrame:
+    """
+    Read the results section of the summary at `path` into a DataFrame with one
+    row per record. String fields are dictionary-encoded as they are read, and
+    returned as categorical columns.
+    """
+    categories = {field: {} for field in RECORD_FIELDS}
+
+    def encode(field, value):
+        cats = categories[field]
+        code = cats.get(value)
+        if code is None:
+            code = cats[value] = len(cats)
+        return code
+
+    # records arrive grouped by everything but the bug, so the codes of the
+    # other fields are only stored once per group, along with its size
+    prefix_codes = array('i')
+    prefix_sizes = array('q')
+    bug_codes = array('i')
+    times = array('q')
+    last_prefix = None
+    for record in iter_records(path, sections, extras, filters):
+        prefix = record[:5]
+        if prefix != last_prefix:
+            prefix_codes.extend(encode(field, value)
+                                for field, value in zip(RECORD_FIELDS, prefix))
+            prefix_sizes.append(0)
+            last_prefix = prefix
+        prefix_sizes[-1] += 1
+        bug_codes.append(encode('bug', record[5]))
+        times.append(int(record[6]))
+
+    prefix_codes = np.frombuffer(prefix_codes, dtype=np.int32).reshape(-1, 5)
+    prefix_sizes = np.frombuffer(prefix_sizes, dtype=np.int64)
+    codes = {field: np.repeat(prefix_codes[:, i], prefix_sizes)
+             for i, field in enumerate(RECORD_FIELDS[:5])}
+    codes['bug'] = np.frombuffer(bug_codes, dtype=np.int32)
+
+    columns = {
+        field: pd.Categorical.from_codes(codes[field],
+                                         list(categories[field]))
+        for field in RECORD_FIELDS
+    }
+    columns['time'] = np.frombuffer(times, dtype=np.int64)
+    return pd.DataFrame(columns)
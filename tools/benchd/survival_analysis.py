@@ -11,20 +11,25 @@ Author: Adrian Herrera
 
 from argparse import ArgumentParser, Namespace
 from collections import defaultdict
+from functools import partial
 from itertools import product
 from math import sqrt
+from multiprocessing import Pool
 from pathlib import Path
-from typing import List, Tuple
-import json
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 import warnings
 
-from lifelines import KaplanMeierFitter
-from lifelines.utils import restricted_mean_survival_time as rmst
+import numpy as np
 import pandas as pd
 
+import bootstrap
+import kaplan_meier
+from summary_reader import read_records
+from survival_cache import DEFAULT_MAX_SIZE, SurvivalCache, fit_key, get_curves
+
 
 METRICS = ('reached', 'triggered')
-ddr = lambda: defaultdict(ddr)
+ENGINES = ('numpy', 'lifelines')
 
 
 def parse_args() -> Namespace:
@@ -36,35 +41,64 @@ def parse_args() -> Namespace:
                         help='Length of an individual trial (in seconds)')
     parser.add_argument('-r', '--raw-data', action='store_true',
                         help='Store the raw run data')
+    parser.add_argument('-e', '--engine', choices=ENGINES, default='numpy',
+                        help='Survival analysis implementation: batched NumPy '
+                             '(default) or one lifelines fit per bug')
+    parser.add_argument('-b', '--bootstrap', type=int, default=0,
+                        metavar='REPLICATES',
+                        help='Compute percentile bootstrap confidence '
+                             'intervals with this many replicates, instead of '
+                             'the variance-based ones')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Seed of the bootstrap resampling')
+    parser.add_argument('-c', '--cache', type=Path,
+                        help='Survival fit cache (shared with report_df), '
+                             'reused across runs')
+    parser.add_argument('--cache-size', type=int,
+                        default=DEFAULT_MAX_SIZE >> 20,
+                        help='Maximum size of the survival fit cache (in MiB)')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='Number of processes over which the fuzzer, '
+                             'target and program groups are split')
     parser.add_argument('json', type=Path,
                         help='Magma-generated JSON file (containing bug data)')
     return parser.parse_args()
 
 
-def get_time_to_bug(data: dict, num_trials: int) -> dict:
-    """Get time-to-bug data from Magma JSON dictionary."""
-    for fuzzer, f_data in data.items():
-        for target, t_data in f_data.items():
-            for program, p_data in t_data.items():
-                bugs = ddr()
-                for run, r_data in p_data.items():
-                    for metric, m_data in r_data.items():
-                        for bug, time in m_data.items():
-                            if metric not in bugs[bug]:
-                                bugs[bug][metric] = [None] * num_trials
-                            bugs[bug][metric][int(run)] = time
-                for bug, b_data in bugs.items():
-                    yield dict(
-                        target=target,
-                        program=program,
-                        fuzzer=fuzzer,
-                        bug=bug,
-                        **b_data,
-                    )
+def get_time_to_bug(records: pd.DataFrame, num_trials: int) -> Iterator[dict]:
+    """Get time-to-bug data from flat Magma records (see summary_reader)."""
+    # bugs are numbered in order of appearance in the JSON file
+    keys = ['fuzzer', 'target', 'program', 'bug']
+    bug_ids = records.groupby(keys, observed=True, sort=False).ngroup() \
+                     .to_numpy()
+    _, first = np.unique(bug_ids, return_index=True)
+    runs = records['run'].astype(int).to_numpy()
+
+    # the time of every run of every bug, or None if it was not found
+    times = {}
+    found = {}
+    for metric in METRICS:
+        mask = (records['metric'] == metric).to_numpy()
+        times[metric] = np.full((len(first), num_trials), None, dtype=object)
+        times[metric][bug_ids[mask], runs[mask]] = \
+            records['time'].to_numpy()[mask].astype(object)
+        found[metric] = np.bincount(bug_ids[mask], minlength=len(first)) > 0
+
+    names = {key: records[key].to_numpy()[first] for key in keys}
+    for bug_id in range(len(first)):
+        yield dict(
+            **{key: names[key][bug_id] for key in keys},
+            **{metric: times[metric][bug_id].tolist() for metric in METRICS
+               if found[metric][bug_id]},
+        )
 
 
 def calc_survival(data: List[int], trial_len: int) -> Tuple[float, float]:
     """Do the survival analysis."""
+    # lifelines is slow to import, and only needed by the lifelines engine
+    from lifelines import KaplanMeierFitter
+    from lifelines.utils import restricted_mean_survival_time as rmst
+
     df = pd.DataFrame(data)
     T = df.fillna(trial_len)
     E = df.notnull()
@@ -81,14 +115,128 @@ def calc_survival(data: List[int], trial_len: int) -> Tuple[float, float]:
     return surv_time_mean, surv_time_ci
 
 
-def main():
-    """The main function."""
-    args = parse_args()
-    num_trials = args.num_trials
+def to_durations(data: List[List[Optional[int]]],
+                 trial_len: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Censor the trials of every bug where the bug was not found."""
+    times = np.array(data, dtype=float).reshape(len(data), -1)
+    observed = ~np.isnan(times)
+    return np.where(observed, times, trial_len), observed
+
+
+def calc_survival_batch(data: List[List[Optional[int]]],
+                        trial_len: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Do the survival analysis of many bugs at once, without lifelines."""
+    durations, observed = to_durations(data, trial_len)
+
+    surv_time_mean, surv_time_var = kaplan_meier.restricted_mean_survival_time(
+        durations, observed, trial_len)
+    # Same confidence interval as calc_survival
+    surv_time_ci = 1.96 * (np.sqrt(np.abs(surv_time_var)) /
+                           np.sqrt(kaplan_meier.timeline_length(durations)))
+
+    return surv_time_mean, surv_time_ci
+
+
+def survival_columns(replicates: int) -> List[str]:
+    """Names of the survival analysis columns of every metric."""
+    columns = ['survival_time', 'survival_ci']
+    if replicates:
+        columns += ['survival_ci_lower', 'survival_ci_upper']
+    return columns
+
+
+def curve_survival(curve: kaplan_meier.SurvivalCurve,
+                   trial_len: int) -> Tuple[float, float]:
+    """Do the survival analysis of a bug from its Kaplan-Meier curve."""
+    mean, var = kaplan_meier.curve_restricted_mean_survival_time(curve,
+                                                                 trial_len)
+    # Same confidence interval as calc_survival
+    return mean, 1.96 * sqrt(abs(var)) / sqrt(len(curve.timeline))
+
+
+def cached_stats(cache: Optional[SurvivalCache], kind: str,
+                 data: List[List[Optional[int]]], trial_len: int,
+                 compute: Callable[[list], Iterable[tuple]],
+                 *extra) -> List[tuple]:
+    """
+    Compute the statistics of every bug with `compute`, unless they are
+    cached under `kind` (and `extra` inputs) already.
+    """
+    results = [None] * len(data)
+    missing = range(len(data))
+    if cache is not None:
+        keys = [fit_key(kind, d, trial_len, trial_len, *extra) for d in data]
+        cached = cache.get_many(keys)
+        for i, key in enumerate(keys):
+            if key in cached:
+                results[i] = tuple(cached[key])
+        missing = [i for i, key in enumerate(keys) if key not in cached]
+
+    if missing:
+        computed = compute([data[i] for i in missing])
+        for i, result in zip(missing, computed):
+            results[i] = tuple(float(x) for x in result)
+        if cache is not None:
+            cache.put_many({keys[i]: results[i] for i in missing})
+    return results
+
+
+def survival_stats(ttbs: List[dict], metric: str, trial_len: int,
+                   engine: str, cache: Optional[SurvivalCache] = None,
+                   replicates: int = 0, seed: int = 0) -> Dict[str, list]:
+    """
+    Do the survival analysis of a metric for all bugs. With bootstrap
+    `replicates`, the confidence interval is the bootstrap percentile interval
+    (and `survival_ci` is its half-width).
+    """
+    columns = {column: [None] * len(ttbs)
+               for column in survival_columns(replicates)}
+    indices = [i for i, ttb in enumerate(ttbs) if metric in ttb]
+    data = [ttbs[i][metric] for i in indices]
+
+    if engine == 'lifelines':
+        import lifelines
+        # the lifelines fits themselves are not cached, only their results
+        stats = cached_stats(
+            cache, 'rmst-lifelines', data, trial_len,
+            lambda misses: [calc_survival(d, trial_len) for d in misses],
+            lifelines.__version__)
+    elif cache is not None:
+        # the Kaplan-Meier curves are shared with report_df
+        stats = [curve_survival(curve, trial_len)
+                 for curve in get_curves(cache, data, trial_len)]
+    else:
+        stats = zip(*calc_survival_batch(data, trial_len)) if data else []
+    for i, (mean, ci) in zip(indices, stats):
+        columns['survival_time'][i] = float(mean)
+        columns['survival_ci'][i] = float(ci)
+
+    if replicates:
+        def compute_bounds(misses):
+            durations, observed = to_durations(misses, trial_len)
+            # The replicates pick trials by position, but the cache key does
+            # not depend on their order, so the trials are sorted first.
+            order = np.lexsort((durations, ~observed), axis=-1)
+            durations = np.take_along_axis(durations, order, axis=-1)
+            observed = np.take_along_axis(observed, order, axis=-1)
+            return zip(*bootstrap.bootstrap_rmst(durations, observed,
+                                                 trial_len, replicates, seed))
+
+        bounds = cached_stats(cache, 'rmst-bootstrap', data, trial_len,
+                              compute_bounds, replicates, seed)
+        for i, (low, high) in zip(indices, bounds):
+            columns['survival_ci_lower'][i] = low
+            columns['survival_ci_upper'][i] = high
+            columns['survival_ci'][i] = (high - low) / 2
+    return columns
 
-    # Ignore warnings
-    warnings.simplefilter('ignore')
 
+def survival_table(ttbs: Iterable[dict], num_trials: int, trial_len: int,
+                   raw_data: bool, engine: str,
+                   cache: Optional[SurvivalCache] = None,
+                   replicates: int = 0, seed: int = 0) -> dict:
+    """Build the survival analysis table of the given time-to-bug data."""
+    ttbs = list(ttbs)
     surv_data = dict(target=[],
                          program=[],
                          bug=[],
@@ -97,19 +245,23 @@ def main():
                          survival_ci_reached=[],
                          survival_time_triggered=[],
                          survival_ci_triggered=[])
+    for metric, column in product(METRICS, survival_columns(replicates)):
+        surv_data[f'{column}_{metric}'] = []
 
     # Create fields for storing the raw times (if required)
-    if args.raw_data:
+    if raw_data:
         for run in range(0, num_trials):
             surv_data[f'reached_{run}'] = []
             surv_data[f'triggered_{run}'] = []
 
-    # Read Magma JSON data
-    with args.json.open() as inf:
-        json_data = json.load(inf).get('results', {})
-
     # Do survival analysis on the time-to-bug results
-    for ttb in get_time_to_bug(json_data, num_trials):
+    for metric in METRICS:
+        columns = survival_stats(ttbs, metric, trial_len, engine, cache,
+                                 replicates, seed)
+        for column, values in columns.items():
+            surv_data[f'{column}_{metric}'] = values
+
+    for ttb in ttbs:
         # Save table data
         surv_data['target'].append(ttb['target'])
         surv_data['program'].append(ttb['program'])
@@ -117,22 +269,96 @@ def main():
         surv_data['fuzzer'].append(ttb['fuzzer'])
 
         # Save raw times (if required)
-        if args.raw_data:
+        if raw_data:
             for metric, run in product(METRICS, range(0, num_trials)):
                 time = ttb.get(metric, [None] * num_trials)[run]
                 surv_data[f'{metric}_{run}'].append(time)
 
-        # Do survival analysis
-        for metric in METRICS:
-            if metric not in ttb:
-                surv_time_mean = None
-                surv_time_ci = None
-            else:
-                surv_time_mean, surv_time_ci = calc_survival(ttb[metric],
-                                                             args.trial_length)
-
-            surv_data[f'survival_time_{metric}'].append(surv_time_mean)
-            surv_data[f'survival_ci_{metric}'].append(surv_time_ci)
+    return surv_data
+
+
+def split_groups(records: pd.DataFrame,
+                 num_chunks: int) -> List[pd.DataFrame]:
+    """
+    Split the Magma records into (at most) `num_chunks` chunks, each with a
+    contiguous range of the (fuzzer, target, program) groups.
+    """
+    group_ids = records.groupby(['fuzzer', 'target', 'program'], observed=True,
+                                sort=False).ngroup().to_numpy()
+    num_groups = group_ids.max() + 1 if len(group_ids) else 0
+    chunk_size = max(1, -(-num_groups // num_chunks))
+
+    return [records[(group_ids >= i) & (group_ids < i + chunk_size)]
+            for i in range(0, num_groups, chunk_size)]
+
+
+def survival_table_chunk(records: pd.DataFrame, num_trials: int,
+                         trial_len: int, raw_data: bool, engine: str,
+                         cache: Optional[SurvivalCache] = None,
+                         replicates: int = 0, seed: int = 0) -> dict:
+    """Build the survival analysis table of a chunk of the records."""
+    warnings.simplefilter('ignore')
+    return survival_table(get_time_to_bug(records, num_trials), num_trials,
+                          trial_len, raw_data, engine, cache, replicates, seed)
+
+
+def parallel_survival_table(records: pd.DataFrame, num_trials: int,
+                            trial_len: int, raw_data: bool, engine: str,
+                            jobs: int,
+                            cache: Optional[SurvivalCache] = None,
+                            replicates: int = 0, seed: int = 0) -> dict:
+    """
+    Build the survival analysis table over a pool of `jobs` processes. Rows
+    are gathered in the same order as `survival_table` produces them.
+    """
+    # more chunks than processes, so that a chunk of slow groups does not
+    # hold up the whole pool
+    chunks = split_groups(records, 4 * jobs)
+    table_chunk = partial(survival_table_chunk, num_trials=num_trials,
+                          trial_len=trial_len, raw_data=raw_data,
+                          engine=engine, cache=cache, replicates=replicates,
+                          seed=seed)
+
+    surv_data = defaultdict(list)
+    with Pool(processes=jobs) as pool:
+        for chunk_data in pool.imap(table_chunk, chunks):
+            for column, values in chunk_data.items():
+                surv_data[column].extend(values)
+    if not surv_data:
+        # same columns as an empty serial table
+        return survival_table([], num_trials, trial_len, raw_data, engine,
+                              cache, replicates, seed)
+    return dict(surv_data)
+
+
+def main():
+    """The main function."""
+    args = parse_args()
+    num_trials = args.num_trials
+
+    # Ignore warnings
+    warnings.simplefilter('ignore')
+
+    # Read Magma JSON data
+    records = read_records(args.json)
+
+    cache = None
+    if args.cache:
+        cache = SurvivalCache(str(args.cache), args.cache_size << 20)
+
+    if args.jobs > 1:
+        surv_data = parallel_survival_table(records, num_trials,
+                                            args.trial_length, args.raw_data,
+                                            args.engine, args.jobs, cache,
+                                            args.bootstrap, args.seed)
+    else:
+        surv_data = survival_table(get_time_to_bug(records, num_trials),
+                                   num_trials, args.trial_length,
+                                   args.raw_data, args.engine, cache,
+                                   args.bootstrap, args.seed)
+
+    if cache is not None:
+        cache.close()
 
     # Write to CSV
     order = ['bug', 'program', 'target', 'fuzzer']
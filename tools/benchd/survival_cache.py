@@ -0,0 +1,188 @@
+"""
+Persistent cache of survival fits, shared by survival_analysis.py and the
+report_df tool.
+
+Entries are keyed by a hash of the kind of fit, the time-to-bug of every trial,
+the trial length (the bound of the restricted mean survival time) and the
+duration at which missing trials are censored. They are stored in an SQLite
+database, and the least recently used entries are evicted once the database
+grows beyond its maximum size.
+
+Both tools fit their Kaplan-Meier curves with `get_curves`, which stores them
+as plain arrays, such that either tool reuses the curves fitted by the other.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import pickle
+import sqlite3
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+import kaplan_meier
+
+DEFAULT_MAX_SIZE = 256 << 20
+# bump whenever the contents of the cached fits change
+CACHE_VERSION = 3
+
+
+def fit_key(kind: str, times: Sequence[Optional[float]], trial_len: float,
+            duration: float, *extra: Any) -> str:
+    """
+    Return the cache key of a fit of `times`, where None or NaN denotes a
+    trial in which the bug was not found. Any `extra` (JSON-serializable)
+    inputs of the fit are also part of the key.
+    """
+    # Kaplan-Meier fits do not depend on the order of the trials. Any other
+    # fit must sort the trials itself before they are cached under this key.
+    found = sorted(float(t) for t in times if t is not None and t == t)
+    data = [CACHE_VERSION, kind, float(trial_len), float(duration), found,
+            len(times) - len(found), *extra]
+    return hashlib.sha256(json.dumps(data).encode()).hexdigest()
+
+
+class SurvivalCache:
+    """
+    A size-bounded, on-disk key-value store of survival fits. The database is
+    opened lazily, such that a cache can be handed over to worker processes.
+    """
+
+    def __init__(self, path: str, max_size: int = DEFAULT_MAX_SIZE):
+        self.path = path
+        self.max_size = max_size
+        self._db = None
+        self._pid = None
+
+    def __getstate__(self):
+        return {'path': self.path, 'max_size': self.max_size}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        if self._db is None or self._pid != os.getpid():
+            self._db = sqlite3.connect(self.path, timeout=60)
+            self._pid = os.getpid()
+            # cheap commits, and concurrent readers while a process writes
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('PRAGMA synchronous=NORMAL')
+            self._db.execute('CREATE TABLE IF NOT EXISTS fits ('
+                             'key TEXT PRIMARY KEY, value BLOB NOT NULL, '
+                             'size INTEGER NOT NULL, atime REAL NOT NULL)')
+        return self._db
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """Return the cached fits of the given keys, if any."""
+        keys = list(keys)
+        found = {}
+        # stay below SQLite's limit on the number of query parameters
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            marks = ','.join('?' * len(chunk))
+            rows = self.db.execute(
+                f'SELECT key, value FROM fits WHERE key IN ({marks})', chunk)
+            for key, value in rows:
+                found[key] = pickle.loads(value)
+            self.db.execute(f'UPDATE fits SET atime = ? WHERE key IN ({marks})',
+                            (time.time(), *chunk))
+        self.db.commit()
+        return found
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached fit of `key`, or None."""
+        return self.get_many([key]).get(key)
+
+    def put_many(self, items: Dict[str, Any]):
+        """Store the given fits."""
+        now = time.time()
+        rows = []
+        for key, value in items.items():
+            value = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+            rows.append((key, value, len(key) + len(value), now))
+        self.db.executemany('INSERT OR REPLACE INTO fits VALUES (?, ?, ?, ?)',
+                            rows)
+        self.db.commit()
+
+    def put(self, key: str, value: Any):
+        """Store the fit of `key`."""
+        self.put_many({key: value})
+
+    def evict(self):
+        """Evict the least recently used fits beyond the maximum size."""
+        total, = self.db.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM fits').fetchone()
+        if total <= self.max_size:
+            return
+        rows = self.db.execute(
+            'SELECT key, size FROM fits ORDER BY atime').fetchall()
+        keys = []
+        for key, size in rows:
+            if total <= self.max_size:
+                break
+            keys.append((key,))
+            total -= size
+        self.db.executemany('DELETE FROM fits WHERE key = ?', keys)
+        self.db.commit()
+        # give the space back to the filesystem
+        self.db.execute('VACUUM')
+        logging.info("Evicted %d fits from %s", len(keys), self.path)
+
+    def close(self):
+        """
+        Evict old fits and close the database. The database is opened if need
+        be, since the fits may have been stored by other processes only.
+        """
+        self.evict()
+        self.db.close()
+        self._db = None
+
+
+def curve_key(times: Sequence[Optional[float]], duration: float) -> str:
+    """Return the cache key of the Kaplan-Meier curve of `times`."""
+    # the curves are fitted with NumPy, whose version is part of the key
+    return fit_key('km-curve', times, duration, duration, np.__version__)
+
+
+def get_curves(cache: Optional[SurvivalCache],
+               trials: Sequence[Sequence[Optional[float]]],
+               duration: float) -> List[kaplan_meier.SurvivalCurve]:
+    """
+    Return the Kaplan-Meier curve of the times of every group of `trials`,
+    where None or NaN denotes a trial in which the bug was not found (and that
+    is censored at `duration`). Only the curves missing from the cache, if
+    any, are fitted.
+    """
+    curves = [None] * len(trials)
+    missing = range(len(trials))
+    if cache is not None:
+        keys = [curve_key(times, duration) for times in trials]
+        cached = cache.get_many(keys)
+        for i, key in enumerate(keys):
+            if key in cached:
+                curves[i] = kaplan_meier.SurvivalCurve(
+                    *(np.asarray(a, dtype=float) for a in cached[key]))
+        missing = [i for i, key in enumerate(keys) if key not in cached]
+
+    for i in missing:
+        times = np.array(trials[i], dtype=float)
+        observed = ~np.isnan(times)
+        curves[i] = kaplan_meier.survival_curve(
+            np.where(observed, times, duration), observed)
+
+    if cache is not None:
+        # plain lists, which do not depend on how NumPy pickles arrays
+        cache.put_many({keys[i]: tuple(a.tolist() for a in curves[i])
+                        for i in missing})
+    return curves
+
@@ -0,0 +1,80 @@
+"""
+Reader for the change-only campaign timeline written by magma/run.sh when the
+TIMELINE option is set.
+
+The timeline is a single append-only file of frames. Every frame starts with a
+"<kind> <timestamp> <length>" line, followed by <length> bytes of payload:
+- H frames hold the CSV header of the canary counters, and are written before
+  the first row and whenever the set of canaries changes.
+- R frames hold a CSV data row, and are only written for polls where some
+  counter changed since the previous recorded poll.
+"""
+
+import logging
+
+TIMELINE_BASENAME = "monitor.timeline"
+
+
+def iter_frames(data):
+    """
+    Yields (kind, timestamp, payload, end) tuples for all the complete frames
+    in `data`, where `end` is the offset right after the frame.
+    """
+    pos = 0
+    while pos < len(data):
+        eol = data.find(b'\n', pos)
+        if eol < 0:
+            break
+        try:
+            kind, timestamp, length = data[pos:eol].split(b' ')
+            length = int(length)
+        except ValueError:
+            logging.warning("Corrupted timeline frame at offset %d", pos)
+            return
+        payload = data[eol + 1:eol + 1 + length]
+        if len(payload) < length:
+            logging.debug("Truncated timeline frame at offset %d", pos)
+            return
+        pos = eol + 1 + length
+        yield kind, timestamp.decode(), payload, pos
+
+
+def read_timeline(data):
+    """
+    Yields (timestamp, dump) pairs from the raw bytes of a timeline file, where
+    every dump has the same contents as a poll file from the legacy monitor
+    directory. A truncated frame at the end of the file is ignored.
+    """
+    header = None
+    for kind, timestamp, payload, _ in iter_frames(data):
+        if kind == b'H':
+            header = payload
+        elif kind == b'R' and header is not None:
+            yield timestamp, header + payload
+
+
+class TimelineFollower:
+    """
+    Incrementally reads a timeline file which is still being appended to.
+    Every call to `read` only returns the polls recorded since the last call.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.offset = 0
+        self.header = None
+
+    def read(self):
+        with open(self.path, 'rb') as f:
+            f.seek(self.offset)
+            data = f.read()
+        dumps = []
+        end = 0
+        for kind, timestamp, payload, end in iter_frames(data):
+            if kind == b'H':
+                self.header = payload
+            elif kind == b'R' and self.header is not None:
+                dumps.append((timestamp, self.header + payload))
+        # a partially-written frame is left for the next call
+        self.offset += end
+        return dumps
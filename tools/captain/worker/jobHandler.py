@@ -56,6 +56,8 @@ def launchRun(fuzzer, target, programName, programArgs, fuzzargs, bound_cpus, gl
         os.environ["POC_EXTRACT"] = str(globalconfig["POC_EXTRACT"])
     if globalconfig.get("NO_ARCHIVE") != None:
         os.environ["NO_ARCHIVE"] = str(globalconfig["NO_ARCHIVE"])
+    if globalconfig.get("TIMELINE") != None:
+        os.environ["TIMELINE"] = str(globalconfig["TIMELINE"])
     subprocess.Popen(f'{magma}/tools/captain/worker/run.sh', shell=True).wait()
 
 
@@ -14,6 +14,7 @@ export ARDIR="$WORKDIR/ar"
 export CACHEDIR="$WORKDIR/cache"
 export LOGDIR="$WORKDIR/log"
 export POCDIR="$WORKDIR/poc"
+export MANIFEST="$WORKDIR/manifest.tsv"
 mkdir -p "$ARDIR"
 mkdir -p "$CACHEDIR"
 mkdir -p "$LOGDIR"
@@ -56,10 +57,25 @@ start_campaign()
 
     if [ -z $NO_ARCHIVE ]; then
         # only one tar job runs at a time, to prevent out-of-storage errors
-        tar -cf "${CAMPAIGN_ARDIR}/${ARCID}/${TARBALL_BASENAME}.tar" -C "$SHARED" . &>/dev/null && rm -rf "$SHARED"
+        tarball="${CAMPAIGN_ARDIR}/${ARCID}/${TARBALL_BASENAME}.tar"
+        if tar -cf "$tarball" -C "$SHARED" . &>/dev/null; then
+            rm -rf "$SHARED"
+            entry="tar\t$(stat -c %s "$tarball")"
+        else
+            echo_time "Failed to archive $FUZZER/$TARGET/$PROGRAM/$ARCID"
+            entry=""
+        fi
     else
         # overwrites empty $ARCID directory with the $SHARED directory
-        mv -T "$SHARED" "${CAMPAIGN_ARDIR}/${ARCID}"
+        if mv -T "$SHARED" "${CAMPAIGN_ARDIR}/${ARCID}"; then
+            entry="dir\t0"
+        else
+            entry=""
+        fi
+    fi
+    # register the archived campaign in the manifest used by benchd/exp2json
+    if [ ! -z "$entry" ]; then
+        printf "%s\t$entry\n" "$FUZZER/$TARGET/$PROGRAM/$ARCID" >> "$MANIFEST"
     fi
 }
 export -f start_campaign
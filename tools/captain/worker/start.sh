@@ -9,6 +9,8 @@
 # - env FUZZARGS: fuzzer arguments
 # - env POLL: time (in seconds) between polls
 # - env TIMEOUT: time to run the campaign
+# + env TIMELINE: if set, polls are recorded in a change-only timeline file
+#       (default: unset)
 # + env SHARED: path to host-local volume where fuzzer findings are saved
 #       (default: no shared volume)
 # + env AFFINITY: the CPU to bind the container to (default: no affinity)
@@ -56,6 +58,7 @@ if [ -t 1 ]; then
         --cap-add=SYS_PTRACE --security-opt seccomp=unconfined \
         --env=PROGRAM="$PROGRAM" --env=ARGS="$ARGS" \
         --env=FUZZARGS="$FUZZARGS" --env=POLL="$POLL" --env=TIMEOUT="$TIMEOUT" \
+        --env=TIMELINE="$TIMELINE" \
         $flag_aff $flag_ep "$IMG_NAME"
 else
     container_id=$(
@@ -63,6 +66,7 @@ else
         --cap-add=SYS_PTRACE --security-opt seccomp=unconfined \
         --env=PROGRAM="$PROGRAM" --env=ARGS="$ARGS" \
         --env=FUZZARGS="$FUZZARGS" --env=POLL="$POLL" --env=TIMEOUT="$TIMEOUT" \
+        --env=TIMELINE="$TIMELINE" \
         --network=none \
         $flag_aff $flag_ep "$IMG_NAME"
     )
@@ -1,45 +1,94 @@
 import pandas as pd
 from pandas import DataFrame
 import numpy as np
-import sys
+import hashlib
 import json
-from collections import Mapping, Iterable
+import logging
+import os
+import sys
+from collections.abc import Mapping
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:
+    pa = None
+
+# the benchd tools share some of their modules with report_df, which the
+# other report_df modules import after this one
+BENCHD_DIR = os.path.normpath(os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), os.pardir, 'benchd'))
+if BENCHD_DIR not in sys.path:
+    sys.path.append(BENCHD_DIR)
+from summary_reader import RECORD_FIELDS, read_records
 
 INDEX_NAMES = ['Fuzzer', 'Target','Program','Campaign','Metric','BugID']
+EXPERIMENT_INDEX_NAMES = ['Experiment'] + INDEX_NAMES
+# bump whenever the layout of the cached frames changes
+FRAME_CACHE_VERSION = 1
+FRAME_CACHE_SUFFIX = '.frame.feather'
+
+def file_digest(filename):
+    """
+    Returns the SHA-256 hex digest of the contents of a file
+    """
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def categorical_frame(columns, time):
+    """
+    Builds the benchmark frame from the categorical columns of its index
+    levels, in INDEX_NAMES order, and the times
+    """
+    levels = [pd.CategoricalIndex(c.categories, categories=c.categories)
+        for c in columns]
+    index = pd.MultiIndex(levels=levels, codes=[c.codes for c in columns],
+        names=INDEX_NAMES)
+    return DataFrame({'Time': time}, index=index)
+
+def filter_table(table, filters):
+    """
+    Returns the rows of a frame snapshot whose index values are accepted by the
+    filters, which map record fields to the accepted values. Only the
+    dictionaries of the index columns are compared to the accepted values, and
+    the rows are selected by their dictionary indices
+    """
+    mask = np.ones(table.num_rows, dtype=bool)
+    for field, values in filters.items():
+        column = table.column(INDEX_NAMES[RECORD_FIELDS.index(field)])
+        accepted = [np.isin(chunk.dictionary.to_numpy(zero_copy_only=False),
+            list(values))[chunk.indices.to_numpy()] for chunk in column.chunks]
+        mask &= np.concatenate(accepted or [np.empty(0, dtype=bool)])
+    return table.filter(pa.array(mask))
 
 #TODO add retrival of experiment infomation (Campaign duration)
 class BenchmarkData:
+    # the index levels above Fuzzer, which the data processing also groups on
+    experiment_levels = []
 
-    def __init__(self,filename, **kwargs):
-        def flatten_key(k):
-            flat = []
-            if isinstance(k, Iterable) and not isinstance(k, str):
-                for inner_value in k:
-                    if isinstance(inner_value, Iterable) and not isinstance(k, str):
-                        flat_value = flatten_key(inner_value)
-                    else:
-                        flat_value = (inner_value,)
-                    flat.extend(flat_value)
-            else:
-                flat.append(k)
-            return flat
-
-        def flatten_dict(d):
-            flat = {}
-            for key, value in d.items():
-                if isinstance(value, Mapping):
-                    inner_flat = flatten_dict(value)
-                    flat.update({
-                        (key, *flatten_key(inner_key)): inner_value
-                        for inner_key, inner_value in inner_flat.items()
-                    })
-                else:
-                    # the value is stored in a list for use by the DataFrame
-                    # as a single column
-                    # TODO read dict as Series instead?
-                    flat[key] = [value]
-            return flat
+    def __init__(self,filename, cache_dir=None, fuzzers=None, targets=None,
+            programs=None, metrics=None, **kwargs):
+        """
+        Loads an experiment summary. The fuzzers, targets, programs and metrics
+        to load can be restricted, in which case all the other ones are
+        skipped while the summary is read.
+
+        :param filename: { The experiment summary file }
+        :type  filename: { string }
+
+        :param cache_dir: { The directory where a binary snapshot of the
+                            loaded frame is kept, or None to always load the
+                            summary. Requires pyarrow. The snapshot always
+                            holds the whole summary, so it is only taken when
+                            nothing is filtered out. }
+        :type  cache_dir: { string }
 
+        :param fuzzers: { The fuzzers to load, or None for all of them.
+                          Likewise for targets, programs and metrics. }
+        :type  fuzzers: { list of strings }
+        """
         def update_dict(d, u):
             for k, v in u.items():
                 if isinstance(v, Mapping):
@@ -48,27 +97,107 @@ class BenchmarkData:
                     d[k] = v
             return d
 
-        print("Load json")
-        with open(filename) as f:
-            json_data = json.load(f)
+        snapshot = None
+        if cache_dir is not None and pa is None:
+            logging.warning("pyarrow is not installed. Not caching the frame")
+        elif cache_dir is not None:
+            # summaries with the same name may live in different directories
+            path_hash = hashlib.sha256(
+                os.path.abspath(filename).encode()).hexdigest()[:16]
+            snapshot = os.path.join(cache_dir, '%s.%s%s' % (
+                os.path.basename(filename), path_hash, FRAME_CACHE_SUFFIX))
+            digest = file_digest(filename)
+
+        filters = {field: values for field, values in (
+            ('fuzzer', fuzzers), ('target', targets), ('program', programs),
+            ('metric', metrics)) if values is not None}
+
+        json_data = None
+        if snapshot is not None:
+            json_data = self._load_snapshot(snapshot, digest, filters)
+        if json_data is None:
+            print("Load json")
+            # the results are streamed into flat records, one per bug and metric
+            # of every campaign, instead of loading the whole json object
+            json_data = {}
+            records = read_records(filename, ('config', 'version'), json_data,
+                filters)
+
+            # load experiment results; the dictionary-encoded record fields map
+            # directly to the codes of the index, whose levels are categorical
+            # (in sorted order) so that grouping does not hash strings again
+            columns = [records[field].cat.set_categories(
+                sorted(records[field].cat.categories)).cat
+                for field in RECORD_FIELDS]
+            df = categorical_frame(columns, records['time'].to_numpy())
+            #Sorting for later performance gain
+            self._df = df.sort_index()
+            # a snapshot of part of the summary could not serve other filters
+            if snapshot is not None and not filters:
+                self._save_snapshot(snapshot, digest, json_data)
 
         # include any custom configuration into the json object
         update_dict(json_data, kwargs)
 
-        # load experiment results
-        df = DataFrame.from_dict(flatten_dict(json_data['results']))
-        df = df.transpose()
-        # change column label from range to regular index
-        df.rename(columns={0: 'Time'}, inplace=True)
-        # change index names
-        df.rename_axis(index=INDEX_NAMES, inplace=True)
-        #Sorting for later performance gain
-        self._df = df.sort_index()
-
         # save configuration parameters
         self._config = json_data.get('config', {})
         self._version = json_data.get('version', 'v1.0')
 
+    def _load_snapshot(self, path, digest, filters=None):
+        """
+        Loads the frame from a snapshot, if it exists and was taken from a
+        summary with the given digest. Only the rows accepted by the filters
+        are converted. Returns the other sections of the summary (config and
+        version), or None if the snapshot is not valid
+        """
+        try:
+            # the uncompressed columns are mapped rather than read
+            table = feather.read_table(path, memory_map=True)
+        except (OSError, pa.ArrowException):
+            return None
+        metadata = json.loads((table.schema.metadata or {}).get(b'magma', b'{}'))
+        if metadata.get('cache_version') != FRAME_CACHE_VERSION or \
+                metadata.get('digest') != digest:
+            logging.info("Frame snapshot %s is stale", path)
+            return None
+        if filters:
+            table = filter_table(table, filters)
+        df = table.to_pandas()
+        columns = [df[name].cat for name in INDEX_NAMES]
+        if filters:
+            columns = [c.remove_unused_categories().cat for c in columns]
+        self._df = categorical_frame(columns, df['Time'].to_numpy())
+        logging.info("Loaded frame snapshot %s", path)
+        return metadata['json_data']
+
+    def _save_snapshot(self, path, digest, json_data):
+        """
+        Saves the frame and the other sections of the summary to a snapshot,
+        which replaces any previous one atomically
+        """
+        metadata = {
+            'cache_version': FRAME_CACHE_VERSION,
+            'digest': digest,
+            'json_data': json_data,
+        }
+        table = pa.Table.from_pandas(self._df.reset_index(), preserve_index=False)
+        table = table.replace_schema_metadata({
+            **table.schema.metadata,
+            b'magma': json.dumps(metadata).encode(),
+        })
+        tmp = '%s.%d.tmp' % (path, os.getpid())
+        try:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            try:
+                # uncompressed, such that the snapshot can be memory-mapped
+                feather.write_feather(table, tmp, compression='uncompressed')
+                os.replace(tmp, path)
+            finally:
+                if os.path.exists(tmp):
+                    os.unlink(tmp)
+        except OSError as ex:
+            logging.warning("Failed to save frame snapshot %s: %s", path, ex)
+
     @property
     def frame(self):
         return self._df
@@ -85,6 +214,13 @@ class BenchmarkData:
     def version(self):
         return self._version
 
+    def durations_of(self, index):
+        """
+        Returns the campaign duration of the entries of an index over the
+        frame, which is the same for all of them
+        """
+        return self.duration
+
     def get_all_fuzzers(self):
         return list(self._df.index.get_level_values('Fuzzer').unique())
 
@@ -93,3 +229,123 @@ class BenchmarkData:
 
     def get_all_metrics(self):
         return list(self._df.index.get_level_values('Metric').unique())
+
+class MultiBenchmarkData:
+    """
+    The benchmark data of several experiments, e.g., of different versions of
+    the fuzzers. Every experiment is loaded as a BenchmarkData of its own, with
+    its own configuration (duration, trials). Their frames are combined into
+    one frame with an additional, outermost Experiment level, on which the
+    data processing functions group as well.
+    """
+    experiment_levels = ['Experiment']
+
+    def __init__(self, filenames, names=None, cache_dirs=None, **kwargs):
+        """
+        :param filenames: { The experiment summary files }
+        :type  filenames: { list of strings }
+
+        :param names: { The names of the experiments. Default: the names of the
+                        summary files, without their extension }
+        :type  names: { list of strings }
+
+        :param cache_dirs: { The frame snapshot directory of every summary, in
+                             place of a single cache_dir for all of them }
+        :type  cache_dirs: { list of strings }
+
+        The other arguments are passed to every BenchmarkData.
+        """
+        filenames = list(filenames)
+        if names is None:
+            names = [os.path.splitext(os.path.basename(f))[0] for f in filenames]
+        names = list(names)
+        if len(names) != len(filenames):
+            raise ValueError("Expected one name per summary file")
+        if len(set(names)) != len(names):
+            raise ValueError("Experiment names must be unique: %s" % names)
+        cache_dir = kwargs.pop('cache_dir', None)
+        if cache_dirs is None:
+            cache_dirs = [cache_dir] * len(filenames)
+        cache_dirs = list(cache_dirs)
+        if len(cache_dirs) != len(filenames):
+            raise ValueError("Expected one cache directory per summary file")
+
+        self._experiments = {name: BenchmarkData(filename, cache_dir=cache_dir,
+                **kwargs)
+            for name, filename, cache_dir in zip(names, filenames, cache_dirs)}
+        self._df = None
+
+    def __getitem__(self, name):
+        return self._experiments[name]
+
+    def __iter__(self):
+        return iter(self._experiments)
+
+    def __len__(self):
+        return len(self._experiments)
+
+    def items(self):
+        return self._experiments.items()
+
+    @property
+    def frame(self):
+        if self._df is None:
+            self._df = self._combine_frames()
+        return self._df
+
+    def _combine_frames(self):
+        """
+        Concatenates the frames of all experiments, by merging the categories of
+        their index levels and re-mapping their codes, rather than the values
+        """
+        frames = [bd.frame for bd in self._experiments.values()]
+        # the experiments keep their order, and the sorted categories of every
+        # level are merged in sorted order, so the result is sorted as well
+        experiments = pd.CategoricalIndex(list(self._experiments),
+            categories=list(self._experiments))
+        levels = [experiments]
+        codes = [np.repeat(np.arange(len(frames), dtype=np.int32),
+            [len(df) for df in frames])]
+        for i in range(len(INDEX_NAMES)):
+            categories = sorted(set().union(
+                *(df.index.levels[i].categories for df in frames)))
+            categories = pd.Index(categories)
+            levels.append(pd.CategoricalIndex(categories, categories=categories))
+            codes.append(np.concatenate([np.asarray(categories.get_indexer(
+                df.index.levels[i].categories), dtype=np.int32)[df.index.codes[i]]
+                for df in frames] or [np.empty(0, dtype=np.int32)]))
+        index = pd.MultiIndex(levels=levels, codes=codes,
+            names=EXPERIMENT_INDEX_NAMES)
+        time = np.concatenate([df['Time'].to_numpy() for df in frames] or
+            [np.empty(0, dtype=np.int64)])
+        return DataFrame({'Time': time}, index=index)
+
+    @property
+    def durations(self):
+        return pd.Series({name: bd.duration for name, bd in self.items()},
+            name='duration').rename_axis('Experiment')
+
+    @property
+    def trials(self):
+        return pd.Series({name: bd.trials for name, bd in self.items()},
+            name='trials').rename_axis('Experiment')
+
+    def durations_of(self, index):
+        """
+        Returns the campaign duration of every entry of an index over the
+        frame, as an array, according to its Experiment level
+        """
+        experiments = np.asarray(index.get_level_values('Experiment'))
+        return self.durations.reindex(experiments).to_numpy()
+
+    def get_all_experiments(self):
+        return list(self._experiments)
+
+    def get_all_fuzzers(self):
+        return list(self.frame.index.get_level_values('Fuzzer').unique())
+
+    def get_all_targets(self):
+        return list(self.frame.index.get_level_values('Target').unique())
+
+    def get_all_metrics(self):
+        return list(self.frame.index.get_level_values('Metric').unique())
@@ -5,10 +5,13 @@ import numpy as np
 from Metric import Metric
 from BenchmarkData import BenchmarkData
 from math import inf
-from lifelines import KaplanMeierFitter
-from lifelines.utils import restricted_mean_survival_time
 import scipy.stats as ss
 
+# BenchmarkData puts the benchd tools on the path
+import bootstrap
+import kaplan_meier
+from survival_cache import get_curves
+
 def average_time_to_metric_data(bd,metric) :
     """
     Reshapes the intial dataframe in a way to obtain the mean and
@@ -23,14 +26,26 @@ def average_time_to_metric_data(bd,metric) :
     average_time = df.iloc[df.index.get_level_values('Metric') == metric].mean(level=['Fuzzer','Target','Program'])
     return average_time
 
-def expected_time_to_trigger_data(bd) :
+def expected_time_to_trigger_data(bd, replicates=0, seed=0) :
     """
     Reshapes the data to compute the expected time-to-trigger for every
     triggered bug. It also computes the aggregate time for every bug, which
-    can be used to sort the bugs
-
-    :param bd: { A BenchmarkData object loaded from experiment summary file }
+    can be used to sort the bugs. With bootstrap replicates, the percentile
+    bootstrap interval of every expected time-to-trigger is returned as well,
+    as a third dataframe with 'lower' and 'upper' column groups. With several
+    experiments, the fuzzers of every experiment are separate columns, and the
+    aggregate time is computed per experiment
+
+    :param bd: { A BenchmarkData object loaded from experiment summary file,
+                 or a MultiBenchmarkData }
     :type  bd: { BenchmarkData }
+
+    :param replicates: { The number of bootstrap replicates, or 0 to skip the
+                         confidence intervals }
+    :type  replicates: { int }
+
+    :param seed: { The seed of the bootstrap resampling }
+    :type  seed: { int }
     """
 
     def expected_time_to_bug(N,M,t):
@@ -55,55 +70,127 @@ def expected_time_to_trigger_data(bd) :
 
         N_minus_M = N - M
         lambda_t = np.log(N / N_minus_M)
-        ett = ((M * t) + N_minus_M * (bd.duration / lambda_t)) / N
+        ett = ((M * t) + N_minus_M * (bd.durations_of(M.index) / lambda_t)) / N
         return ett
 
+    #The levels above Fuzzer, if any, are kept apart like fuzzers
+    experiments = bd.experiment_levels
+    bug_levels = experiments + ['Fuzzer','Target','Program','BugID']
 
     df = bd.frame
     df_triggered = df[df.index.get_level_values('Metric') == Metric.TRIGGERED.value]
-    t = df_triggered.groupby(['Fuzzer','Target','Program','BugID'])['Time'].mean()
-    M = df_triggered.groupby(['Fuzzer','Target','Program','BugID'])['Time'].count()
-    N_raw = df.reset_index().groupby(['Fuzzer', 'Target', 'Program'])['Campaign'].nunique()
+    t = df_triggered.groupby(bug_levels, observed=True)['Time'].mean()
+    M = df_triggered.groupby(bug_levels, observed=True)['Time'].count()
+    N_raw = df.reset_index().groupby(experiments + ['Fuzzer', 'Target', 'Program'], observed=True)['Campaign'].nunique()
     N = N_raw.reindex_like(M)
-    df_ett = expected_time_to_bug(N,M,t).groupby(['Fuzzer','Target','BugID']).min().droplevel(1).unstack().transpose()
+    df_ett = expected_time_to_bug(N,M,t).groupby(experiments + ['Fuzzer','Target','BugID'], observed=True).min().droplevel('Target').unstack('BugID').transpose()
 
     #Aggregate time computation
     #NOT COMPLETE
     #Extracting the program for which the bug did best
     prog_bug = expected_time_to_bug(N,M,t).reset_index(name='Time')
-    prog_bug = prog_bug.loc[prog_bug.groupby(['Fuzzer','Target','BugID'])['Time'].idxmin()]
-    prog_bug = prog_bug.set_index(['Fuzzer','Target','Program','BugID'])
+    #A stable sort keeps the first program among ties, like idxmin
+    prog_bug = prog_bug.sort_values('Time', kind='stable') \
+                       .drop_duplicates(experiments + ['Fuzzer','Target','BugID'])
+    prog_bug = prog_bug.set_index(bug_levels).sort_index()
 
     #Computing the average time to trigger bug over all fuzzers and libraries including all programs
-    M_agg = df_triggered.groupby(['Fuzzer','Target','Program','BugID'])['Time'].count()
-    t_agg = df_triggered.groupby(['Fuzzer','Target','Program','BugID'])['Time'].sum()
+    M_agg = df_triggered.groupby(bug_levels, observed=True)['Time'].count()
+    t_agg = df_triggered.groupby(bug_levels, observed=True)['Time'].sum()
 
     #Only considering the program where the bug did best
     M_agg = M_agg[M_agg.index.isin(prog_bug.index)]
     t_agg = t_agg[t_agg.index.isin(prog_bug.index)]
-    M_agg = M_agg.groupby('BugID').sum()
-    t_agg = t_agg.groupby('BugID').sum() / M_agg
-
-    #Counting the number of campaigns for each bug in every program,target and fuzzer
-    def count_campaigns(group):
-        target = next(iter(group.groupby(['Target', 'Program']).groups.keys()))
-        sum = 0
-        for fuzzer in N_raw.index.levels[0]:
-            idx = (fuzzer, *target)
-            if idx in N_raw:
-                sum += N_raw.loc[idx]
-        return sum
-    N_agg = prog_bug.groupby('BugID').apply(count_campaigns)
+    M_agg = M_agg.groupby(experiments + ['BugID'], observed=True).sum()
+    t_agg = t_agg.groupby(experiments + ['BugID'], observed=True).sum() / M_agg
+
+    #Counting the number of campaigns for each bug in every program,target and fuzzer,
+    #for the first (target, program) where the bug did best
+    N_programs = N_raw.groupby(experiments + ['Target', 'Program'], observed=True).sum()
+    bug_programs = prog_bug.index.to_frame(index=False)[experiments + ['BugID', 'Target', 'Program']]
+    bug_programs = bug_programs.sort_values(experiments + ['BugID', 'Target', 'Program']) \
+                               .drop_duplicates(experiments + ['BugID'])
+    N_agg = pd.Series(
+        N_programs.reindex(pd.MultiIndex.from_frame(bug_programs[experiments + ['Target', 'Program']])).to_numpy(),
+        index=bug_programs.set_index(experiments + ['BugID']).index)
 
     agg = expected_time_to_bug(N_agg,M_agg,t_agg)
     agg = agg.sort_values()
-    return df_ett, agg
+    if not replicates:
+        return df_ett, agg
+
+    #Confidence intervals of the program for which the bug did best
+    lower, upper = expected_time_to_trigger_ci(bd, df_triggered, N, replicates, seed)
+    df_ci = pd.concat({
+        'lower': lower[lower.index.isin(prog_bug.index)],
+        'upper': upper[upper.index.isin(prog_bug.index)],
+    }, axis=1).droplevel(['Target', 'Program']).unstack(experiments + ['Fuzzer'])
+    df_ci = df_ci.reindex(index=df_ett.index)
+    return df_ett, agg, df_ci
+
+def expected_time_to_trigger_ci(bd, df_triggered, N, replicates, seed):
+    """
+    Computes the bootstrap interval of the expected time-to-trigger of every
+    bug. The campaigns of all bugs are resampled at once, as a
+    (bugs x replicates x campaigns) array.
+
+    :param df_triggered: { The triggered records of the benchmark data }
+    :type  df_triggered: { MultiIndex Dataframe }
+
+    :param N: { Levels = ['Fuzzer', 'Target','Program','BugID'].
+                Contains the total number of campaigns in every level. }
+    :type  N: { MultiIndex Dataframe }
+    """
+    levels = bd.experiment_levels + ['Fuzzer','Target','Program','BugID']
+    groups = df_triggered.groupby(levels, observed=True)['Time']
+    codes = groups.ngroup().to_numpy()
+    positions = groups.cumcount().to_numpy()
+    index = N.index
+
+    #One row per bug with its trigger times, padded with NaN for the
+    #campaigns where it was not triggered
+    sizes = N.to_numpy().astype(np.int64)
+    times = np.full((len(index), sizes.max(initial=1)), np.nan)
+    times[codes, positions] = df_triggered['Time'].to_numpy()
+
+    def ett_statistic(duration):
+        def ett(times, valid):
+            triggered = valid & ~np.isnan(times)
+            N = valid.sum(axis=-1)
+            M = triggered.sum(axis=-1)
+            t = np.where(triggered, times, 0).sum(axis=-1) / np.maximum(M, 1)
+            #Bugs that are never triggered in a replicate take forever
+            with np.errstate(divide='ignore', invalid='ignore'):
+                N_minus_M = N - M
+                lambda_t = np.log(N / N_minus_M)
+                return ((M * t) + N_minus_M * (duration / lambda_t)) / N
+        return ett
+
+    #Every experiment is resampled on its own, with its campaign duration,
+    #such that its intervals do not depend on the other experiments
+    durations = np.broadcast_to(bd.durations_of(index), len(index))
+    if bd.experiment_levels:
+        experiments = np.asarray(index.get_level_values('Experiment'))
+    else:
+        experiments = np.zeros(len(index))
+    lower = np.empty(len(index))
+    upper = np.empty(len(index))
+    for experiment in pd.unique(experiments):
+        rows = experiments == experiment
+        width = sizes[rows].max(initial=1)
+        lower[rows], upper[rows] = bootstrap.bootstrap_groups(
+            ett_statistic(durations[rows][0]), (times[rows, :width],),
+            replicates, seed, sizes=sizes[rows])
+    return pd.Series(lower, index=index), pd.Series(upper, index=index)
 
 def unique_bugs_per_target_data(bd, metric):
     """
-    Returns for each Campaign the number of unique bugs triggered
+    Returns for each Campaign the number of unique bugs triggered. With
+    several experiments, the fuzzers of every experiment are compared with
+    each other as well
 
-    :param bd: { A BenchmarkData object loaded from experiment summary file }
+    :param bd: { A BenchmarkData object loaded from experiment summary file,
+                 or a MultiBenchmarkData }
     :type  bd: { BenchmarkData }
     """
 
@@ -118,7 +205,15 @@ def unique_bugs_per_target_data(bd, metric):
 
         #For every fuzzer we gather in a list the number of times a bug was found
         #Entry 0 in the list is for campaign 0
-        fuzzer_data = series.groupby('Fuzzer').apply(list)
+        fuzzer_data = series.groupby(fuzzer_key, observed=True).apply(list)
+        if experiments:
+            #The fuzzers of every experiment are compared as (experiment, fuzzer)
+            fuzzer_label = pd.MultiIndex.from_tuples(fuzzer_data.index.tolist())
+            return pd.DataFrame(
+                [[two_sided_test(f1, f2, fuzzer_data) for f2 in fuzzer_label]
+                 for f1 in fuzzer_label],
+                index=fuzzer_label.set_names(experiments + ['Outer']),
+                columns=fuzzer_label.set_names(experiments + ['Inner']))
         fuzzer_label = fuzzer_data.index.tolist()
         #Constructing the index from the cross product of the fuzzer_label
         #The index has already the shape of the targeted p_value dataframe
@@ -140,24 +235,36 @@ def unique_bugs_per_target_data(bd, metric):
         else:
             return ss.mannwhitneyu(fuzzer_data[f1],fuzzer_data[f2], alternative='two-sided').pvalue
 
+    def fill_campaigns(unique_bugs):
+        return unique_bugs.unstack('Campaign', fill_value=0) \
+                          .stack(level=0)
+
+    #The levels above Fuzzer, if any, are kept apart like fuzzers
+    experiments = bd.experiment_levels
+    fuzzer_key = experiments + ['Fuzzer'] if experiments else 'Fuzzer'
+
     df = bd.frame
     df = df.iloc[df.index.get_level_values('Metric') == metric]
     #Extract the number of unique bugs per campaign
-    unique_bugs = df.reset_index().groupby(['Fuzzer','Target','Campaign'])['BugID'].nunique()
+    unique_bugs = df.reset_index().groupby(experiments + ['Fuzzer','Target','Campaign'], observed=True)['BugID'].nunique()
     #Unstack and stack back to fill the missing campaign values in case there is
     #not the same number of campaigns for every target/fuzzer.
     #This is needed because the Mann-Whitney U-test requires the same number of
     #samples for both sample sets.
-    unique_bugs = unique_bugs.unstack('Campaign', fill_value=0) \
-                             .stack(level=0)
-
-    agg = unique_bugs.groupby(['Fuzzer', 'Target']) \
+    #Every experiment is only filled with its own campaigns.
+    if experiments:
+        unique_bugs = unique_bugs.groupby(experiments, observed=True, group_keys=False) \
+                                 .apply(fill_campaigns)
+    else:
+        unique_bugs = fill_campaigns(unique_bugs)
+
+    agg = unique_bugs.groupby(experiments + ['Fuzzer', 'Target'], observed=True) \
                      .apply(lambda d: pd.DataFrame([d.mean(), d.std()],
                                                    index=['Mean', 'Std']) \
                                         .unstack()
                       )
 
-    p_values = unique_bugs.groupby('Target') \
+    p_values = unique_bugs.groupby('Target', observed=True) \
                           .apply(lambda d: compute_p_values(
                                             d.reset_index('Target', drop=True)
                                            )
@@ -167,9 +274,10 @@ def unique_bugs_per_target_data(bd, metric):
 
 def number_of_unique_bugs_found_data(bd):
     """
-    Computed the total number of found bugs by each fuzzer
+    Computed the total number of found bugs by each fuzzer, of every experiment
 
-    :param bd: { A BenchmarkData object loaded from experiment summary file }
+    :param bd: { A BenchmarkData object loaded from experiment summary file,
+                 or a MultiBenchmarkData }
     :type  bd: { BenchmarkData }
     """
 
@@ -177,7 +285,7 @@ def number_of_unique_bugs_found_data(bd):
     #Extracting all found bugs
     df_triggered = df.iloc[df.index.get_level_values('Metric') == Metric.TRIGGERED.value]
     #Reseting the index is necessary to get the number of unique bugs triggered by each fuzzer
-    num_trigg = df_triggered.reset_index().groupby(['Fuzzer'])['BugID'].nunique().to_frame()
+    num_trigg = df_triggered.reset_index().groupby(bd.experiment_levels + ['Fuzzer'], observed=True)['BugID'].nunique().to_frame()
     num_trigg.columns = ['Bugs']
     return num_trigg
 
@@ -204,7 +312,7 @@ def bug_list(bd,fuzzer,target,metric):
     df = bd.get_frame()
     #Extracting the bug fullfilling the metric by putting there metric times into a list
     df_bugs = df.iloc[df.index.get_level_values('Metric') == metric]
-    df_bugs = df_bugs.loc[fuzzer,target].groupby('BugID')['Time'].apply(list)
+    df_bugs = df_bugs.loc[fuzzer,target].groupby('BugID', observed=True)['Time'].apply(list)
     #Preparing the new index to be the bugs
     index = df_bugs.index.tolist()
     #Reseting the index and converting the data in the column Time into a new Dataframe
@@ -214,9 +322,11 @@ def bug_list(bd,fuzzer,target,metric):
 def line_plot_data(bd,target,metric) :
     """
     Returns a Dataframe that has a row for every fuzzer and 3 columns (x,y,ci) representing repectively
-    the datapoints to place on x and y axis alongside with the error margin
+    the datapoints to place on x and y axis alongside with the error margin, as arrays.
+    With several experiments, there is a row for every fuzzer of every experiment
 
-    :param bd: { A BenchmarkData object loaded from experiment summary file }
+    :param bd: { A BenchmarkData object loaded from experiment summary file,
+                 or a MultiBenchmarkData }
     :type  bd: { BenchmarkData }
 
     :param target: { chosen target }
@@ -226,84 +336,100 @@ def line_plot_data(bd,target,metric) :
     :type  metric: { string }
     """
 
-    def get_step_value(fuzzer,x_values, campaigns):
+    def step_values(campaigns, num_campaigns, times, x_values):
         """
-        For every x_value we have to compute the step values
+        Evaluates the number of bugs found by every campaign at every x_value,
+        as a (campaigns x x_values) array. Campaigns without any time only
+        contribute zeros
         """
 
-        #Extracting data for the correct fuzzer
-        df_fuzz = campaigns.iloc[campaigns.index.get_level_values('Fuzzer') == fuzzer]
-
-        campaigns_data = df_fuzz.groupby(['Campaign'])['Time'].apply(lambda x : sorted(list(x)))
-        num_campaigns = len(campaigns_data.index)
+        #Sorting the times by campaign first, such that every campaign is a
+        #contiguous run of keys and the step functions of all campaigns are
+        #evaluated with a single search
+        span = times.max() + 1
+        keys = np.sort(campaigns * span + times)
+        starts = np.searchsorted(keys, np.arange(num_campaigns) * span)
+        queries = np.arange(num_campaigns)[:, None] * span + x_values
+        return np.searchsorted(keys, queries, side='right') - starts[:, None]
 
-        #The series has the sorted time to metric for every bug as index and as value
-        def step_val(series,x):
-            serie = series[series.index <= x]
-            if (serie.empty):
-                return 0
-            return serie.iloc[-1] + 1
-        #The series has to been inverted, the index has to be the time values and the actual values have to be the index
-        ##For each of the values in x we compute an array containing a step_value for each campaign
-        y_values = [[step_val(pd.Series([i for i in range(0,len(campaigns_data.loc[str(campaign)]))],index=campaigns_data.loc[str(campaign)]), x)
-                    for campaign in range(0,num_campaigns)] for x in x_values]
-        return y_values
+    #The levels above Fuzzer, if any, are kept apart like fuzzers
+    experiments = bd.experiment_levels
+    fuzzer_key = experiments + ['Fuzzer'] if experiments else 'Fuzzer'
 
+    df = bd.frame
+    df_target = df.iloc[df.index.get_level_values('Target') == target]
+    df_lib = df_target.iloc[df_target.index.get_level_values('Metric') == metric]
 
-    df = bd.get_frame()
-    df_metric = df.iloc[df.index.get_level_values('Metric') == metric]
-    df_lib = df_metric.iloc[df_metric.index.get_level_values('Target') == target]
+    #Every campaign of a fuzzer on the target counts, including the ones that
+    #have no time to metric
+    target_campaigns = df_target.reset_index()[experiments + ['Fuzzer', 'Campaign']] \
+                                .drop_duplicates() \
+                                .groupby(fuzzer_key, observed=True)['Campaign'] \
+                                .apply(lambda c: np.unique(c.to_numpy()))
 
     #For each unique BugID in each campaign in multiple Programs, only retain the smallest time to metric
-    df_lib = df_lib.groupby(['Fuzzer','Target','Campaign','BugID']).min()
-
-    x_plot = df_lib.groupby(['Fuzzer'])['Time'].apply(lambda x : sorted(set(x))).to_frame()
-    x_plot.columns = ['x']
-    y_plot = x_plot
-    index = x_plot.index
-    #Reseting index to be able to pass index values as argument
-    y_plot = y_plot.reset_index()
-    y_plot = y_plot.apply(lambda f : get_step_value(f['Fuzzer'],f['x'],df_lib),axis=1).to_frame()
-    y_plot.index = index
-    y_plot.columns = ['y']
-    df_aggplot = x_plot
-    df_aggplot['y'] = y_plot
-    #Error margin computation
-    df_aggplot['ci'] = df_aggplot['y'].apply(lambda x : [1.96 * np.nanstd(i) / np.nanmean(i) for i in x])
-    df_aggplot['y'] = df_aggplot['y'].apply(lambda x : [np.nanmean(i) for i in x])
+    df_lib = df_lib.groupby(experiments + ['Fuzzer','Target','Campaign','BugID'], observed=True).min()
+
+    plots = {}
+    for fuzzer, df_fuzz in df_lib.groupby(fuzzer_key, observed=True):
+        times = df_fuzz['Time'].to_numpy()
+        all_campaigns = target_campaigns[fuzzer]
+        campaigns = np.searchsorted(all_campaigns,
+            np.asarray(df_fuzz.index.get_level_values('Campaign')))
+        x = np.unique(times)
+        y = step_values(campaigns, len(all_campaigns), times, x)
+        #Error margin computation
+        mean = y.mean(axis=0)
+        plots[fuzzer] = (x, mean, 1.96 * y.std(axis=0) / mean)
+    df_aggplot = pd.DataFrame.from_dict(plots, orient='index', columns=['x', 'y', 'ci'])
+    if experiments:
+        df_aggplot.index = pd.MultiIndex.from_tuples(df_aggplot.index,
+                                                     names=experiments + ['Fuzzer'])
+    else:
+        df_aggplot.index.name = 'Fuzzer'
 
     #For every fuzzer we get the max value and the min value for x and y
     #Then we have to recompute the max between them
-    x_max = max([max(x) for x in df_aggplot['x']])
-    x_min = min([min(x) for x in df_aggplot['x']])
-    y_max = max([max(y) for y in df_aggplot['y']])
+    x_max = max([x.max() for x in df_aggplot['x']])
+    x_min = min([x.min() for x in df_aggplot['x']])
+    y_max = max([y.max() for y in df_aggplot['y']])
 
     return df_aggplot, x_max, y_max, x_min
 
-def bug_survival_data(bd):
+def bug_survival_data(bd, survival_cache=None):
+    """
+    Fits the Kaplan-Meier curve of every bug, for every fuzzer and metric, and
+    computes their restricted mean survival times. With several experiments,
+    the fuzzers of every experiment are separate columns, and the curves are
+    restricted to the campaign duration of their experiment
+
+    :param bd: { A BenchmarkData object loaded from experiment summary file,
+                 or a MultiBenchmarkData }
+    :type  bd: { BenchmarkData }
+
+    :param survival_cache: { A cache of fitted survival curves, or None }
+    :type  survival_cache: { SurvivalCache }
+    """
     def fit_kmf_one(group, supergroup_name, N):
-        fuzzer = group.name[0]
+        fuzzer = group.name[:-1]
         target, program = supergroup_name[:2]
-        if (fuzzer, target, program) in N:
-            N = N.loc[(fuzzer, target, program)]
+        if (*fuzzer, target, program) in N:
+            N = N.loc[(*fuzzer, target, program)]
         else:
             N = 1
         records = group.reset_index(drop=True)['Time'].reindex(np.arange(N))
-        T = records.fillna(bd.duration)
-        E = records.notnull()
-        kmf = KaplanMeierFitter()
-        kmf.fit(T, E, label='%s' % (fuzzer))
-        return kmf
+        #The curves of all groups are fitted at once, afterwards
+        return tuple(records.tolist())
 
     def fit_kmf_all(group, N):
         def fillmissing(group, supergroup_name):
             target, program, bug = supergroup_name
-            fuzzer = group.name
+            fuzzer = group.name if experiments else (group.name,)
             metrics = set(['reached', 'triggered'])
             group_metrics = set(group['Metric'].unique())
             for metric in metrics.difference(group_metrics):
                 new_row = pd.Series({
-                    'Fuzzer': fuzzer,
+                    **dict(zip(fuzzer_levels, fuzzer)),
                     'Target': target,
                     'Program': program,
                     'Campaign': 0,
@@ -314,41 +440,69 @@ def bug_survival_data(bd):
             return group
 
         name = group.name
-        fuzzers = N.index.get_level_values('Fuzzer').unique()
-        fuzzers_in_group = group['Fuzzer'].unique()
+        #The fuzzers are (experiment, fuzzer) tuples with several experiments
+        fuzzers = pd.MultiIndex.from_frame(
+            N.index.to_frame(index=False)[fuzzer_levels]).unique()
+        fuzzers_in_group = set(pd.MultiIndex.from_frame(group[fuzzer_levels]))
         for fuzzer in fuzzers:
             if fuzzer in fuzzers_in_group:
                 continue
             new_rows = [
                 pd.Series({
-                    'Fuzzer': fuzzer,
+                    **dict(zip(fuzzer_levels, fuzzer)),
                     'Metric': 'reached'
                 }),
                 pd.Series({
-                    'Fuzzer': fuzzer,
+                    **dict(zip(fuzzer_levels, fuzzer)),
                     'Metric': 'triggered'
                 }),
             ]
             group = group.append(new_rows, ignore_index=True)
 
-        group = group.groupby('Fuzzer').apply(fillmissing, name).reset_index(drop=True)
+        group = group.groupby(fuzzer_key, observed=True).apply(fillmissing, name).reset_index(drop=True)
 
-        subgroups = group.groupby(['Fuzzer','Metric']).apply(fit_kmf_one, name, N)
+        subgroups = group.groupby(fuzzer_levels + ['Metric'], observed=True).apply(fit_kmf_one, name, N)
         return subgroups
 
+    #The levels above Fuzzer, if any, are kept apart like fuzzers
+    experiments = bd.experiment_levels
+    fuzzer_levels = experiments + ['Fuzzer']
+    fuzzer_key = fuzzer_levels if experiments else 'Fuzzer'
+
     df = bd.frame
-    N = df.reset_index().groupby(['Fuzzer', 'Target', 'Program'])['Campaign'].nunique()
-    kmf = df.reset_index() \
-            .groupby(['Target', 'Program', 'BugID']) \
+    N = df.reset_index().groupby(fuzzer_levels + ['Target', 'Program'], observed=True)['Campaign'].nunique()
+    #Missing rows are filled in with plain values, so the levels are decoded
+    records = df.reset_index()
+    records = records.astype({name: object for name in df.index.names})
+    kmf = records \
+            .groupby(['Target', 'Program', 'BugID'], observed=True) \
             .apply(fit_kmf_all, N)
 
+    # fit the Kaplan-Meier curves of all groups, reusing the cached ones; the
+    # curves of every campaign duration are fitted together
+    records = kmf.to_numpy().ravel()
+    durations = np.broadcast_to(bd.durations_of(kmf.columns), kmf.shape).ravel()
+    curves = np.empty(len(records), dtype=object)
+    for duration in np.unique(durations):
+        rows = np.flatnonzero(durations == duration)
+        for i, curve in zip(rows, get_curves(survival_cache, records[rows], duration)):
+            curves[i] = curve
+    kmf = pd.DataFrame(curves.reshape(kmf.shape), index=kmf.index, columns=kmf.columns)
+
     # get the mean survival time for every (target, program, bug, fuzzer, metric) tuple
-    means = kmf.applymap(lambda k: restricted_mean_survival_time(k, bd.duration))
+    means = np.array([kaplan_meier.curve_restricted_mean_survival_time(k, duration)[0]
+        for k, duration in zip(curves, durations)])
+    means = pd.DataFrame(means.reshape(kmf.shape), index=kmf.index, columns=kmf.columns)
     # re-arrange the dataframe such that the columns are the metrics
-    means = means.stack(level=0)
+    means = means.stack(level=list(range(len(fuzzer_levels))))
     # for every (target, bug, fuzzer) tuple, select the row corresponding to the program where the bug was triggered earliest
-    means = means.loc[means.groupby(['Target', 'BugID', 'Fuzzer'])[Metric.TRIGGERED.value].idxmin()]
+    means = means.loc[means.groupby(['Target', 'BugID'] + fuzzer_levels, observed=True)[Metric.TRIGGERED.value].idxmin()]
     # re-arrange dataframe so that index is (target, bug) and columns are (fuzzer, metric)
-    means = means.droplevel('Program').stack().unstack(-2).unstack()
+    means = means.droplevel('Program').stack()
+    for level in fuzzer_levels + ['Metric']:
+        means = means.unstack(level)
+    if experiments:
+        # only the fuzzers of every experiment, not all their combinations
+        means = means.loc[:, means.columns.isin(kmf.columns)]
 
     return kmf, means
@@ -51,7 +51,7 @@ def expected_time_to_trigger(bd, outdir):
                             norm=colors.PowerNorm(gamma=0.32),
                             ax=ax)
     #Color bar properties
-    max_num_trials = bd.frame.reset_index().groupby('Fuzzer')['Campaign'] \
+    max_num_trials = bd.frame.reset_index().groupby('Fuzzer', observed=True)['Campaign'] \
                        .nunique().max()
     xticks = list_ticks(bd.duration * max_num_trials)[4:]
     xticklables = list(map(lambda x: pp_time(x), xticks))
@@ -115,11 +115,11 @@ def unique_bugs_per_target(bd, outdir, metric, libraries=None, symmetric=False,
     fig.savefig(path, bbox_inches='tight')
 
     fig, ax = plt.subplots(figsize=(12, 6))
-    unique_bugs.groupby(['Fuzzer','Target']) \
+    unique_bugs.groupby(['Fuzzer','Target'], observed=True) \
                .mean().unstack(0) \
                .plot.bar(width=0.8,
                          ax=ax,
-                         yerr=unique_bugs.groupby(['Fuzzer','Target']) \
+                         yerr=unique_bugs.groupby(['Fuzzer','Target'], observed=True) \
                                          .std().unstack(0)
                 )
     ax.legend(loc='upper left', bbox_to_anchor=(1,1))
@@ -174,7 +174,7 @@ def bug_metric_boxplot(bd, outdir):
         return name
 
     df = bd.frame
-    outfiles = df.groupby(['Fuzzer', 'Target', 'Program', 'Metric']) \
+    outfiles = df.groupby(['Fuzzer', 'Target', 'Program', 'Metric'], observed=True) \
                  .apply(plot_boxes)
 
     return outfiles
@@ -233,12 +233,14 @@ def line_plot_unqiue_bugs(bd, outdir, fuzzers, target, metric) :
     plt.close()
     return name
 
-def bug_survival_plots(bd, outdir):
+def bug_survival_plots(bd, outdir, survival_cache=None):
     """
     { TODO document this function }
 
     :param bd: { A BenchmarkData object loaded from experiment summary file }
     :type  bd: { BenchmarkData }
+    :param survival_cache: { A cache of fitted survival curves, or None }
+    :type  survival_cache: { SurvivalCache }
     """
 
     FUZZERS = bd.get_all_fuzzers()
@@ -252,7 +254,7 @@ def bug_survival_plots(bd, outdir):
     metric_linestyles = dict(zip(METRICS, LINESTYLES))
     fuzzer_colors = dict(zip(FUZZERS, COLORS))
 
-    kmf, means = DataProcessing.bug_survival_data(bd)
+    kmf, means = DataProcessing.bug_survival_data(bd, survival_cache)
 
     ###
     # Plot means table
@@ -266,16 +268,16 @@ def bug_survival_plots(bd, outdir):
             mask = mask.unstack().apply(lambda x: x == x.name)
             return mask.reindex_like(df)
 
-        uniq_min = df.stack(level=0).groupby(level=0) \
+        uniq_min = df.stack(level=0).groupby(level=0, observed=True) \
                         .apply(lambda x: x[x == x.min()].count() == 1).stack()
-        uniq_max = df.stack(level=0).groupby(level=0) \
+        uniq_max = df.stack(level=0).groupby(level=0, observed=True) \
                         .apply(lambda x: x[x == x.max()].count() == 1).stack()
 
         # filter out entries which do not need to be highlighted
-        mins = df.stack().groupby(level=0, as_index=False) \
+        mins = df.stack().groupby(level=0, as_index=False, observed=True) \
                             .idxmin(axis=1).droplevel(0)
         mins = mins[uniq_min == True]
-        maxs = df.stack().groupby(level=0, as_index=False) \
+        maxs = df.stack().groupby(level=0, as_index=False, observed=True) \
                             .idxmax(axis=1).droplevel(0)
         maxs = maxs[uniq_max == True]
         survivals = df == bd.duration
@@ -293,7 +295,7 @@ def bug_survival_plots(bd, outdir):
     # adjust dataframe for better presentation
     means = means.droplevel('Target')
 
-    agg = means.stack(0).groupby('BugID') \
+    agg = means.stack(0).groupby('BugID', observed=True) \
                         .apply(lambda x: pd.Series(
                             {
                                 Metric.REACHED.value:   x[Metric.REACHED.value].mean(),
@@ -410,13 +412,17 @@ def bug_survival_plots(bd, outdir):
     ###
     def plot_target_program_bug(series):
         fig, ax = plt.subplots(figsize=(10,6))
-        for ((fuzzer, metric), kmf) in series.items():
-            kmf.plot(
-                ax=ax, ci_show=True, legend=False,
+        for ((fuzzer, metric), curve) in series.items():
+            #Drawn like lifelines plots a fitted KaplanMeierFitter
+            ax.step(curve.timeline, curve.survival, where='post',
                 marker=metric_markers[metric],
                 linestyle=metric_linestyles[metric],
                 color=fuzzer_colors[fuzzer]
             )
+            ax.fill_between(curve.timeline, curve.lower, curve.upper,
+                step='post', alpha=0.25, linewidth=1.0,
+                color=fuzzer_colors[fuzzer]
+            )
 
         xticks = list_ticks(bd.duration)
         xticklables = list(map(lambda x: pp_time(x), xticks))
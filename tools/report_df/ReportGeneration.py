@@ -1,9 +1,17 @@
 import jinja2
+import DataProcessing
 import MatplotlibPlotter
 from Metric import Metric
 import os
 import errno
 
+def ensure_dir(path):
+    try:
+        os.makedirs(path)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+
 def generate_main_page(bd, base, env, **kwargs):
     def pp_time(time):
         if time < 60:
@@ -42,14 +50,8 @@ def generate_fuzzer_page(bd, base, env, fuzzer, **kwargs):
     html = template.render(base_template=base, fuzzer=fuzzer, **kwargs)
     return html
 
-def generate_report(bd, outdir, report_title="Report", **kwargs):
-    def ensure_dir(path):
-        try:
-            os.makedirs(path)
-        except OSError as e:
-            if e.errno != errno.EEXIST:
-                raise
-
+def generate_report(bd, outdir, report_title="Report", survival_cache=None,
+        **kwargs):
     ensure_dir(os.path.join(outdir, 'css'))
     ensure_dir(os.path.join(outdir, 'data'))
     ensure_dir(os.path.join(outdir, 'plot'))
@@ -59,7 +61,7 @@ def generate_report(bd, outdir, report_title="Report", **kwargs):
     boxplots = MatplotlibPlotter.bug_metric_boxplot(bd, outdir)
     uniq_bugs, sigmatrix = MatplotlibPlotter.unique_bugs_per_target(bd, outdir, Metric.TRIGGERED.value)
     ett = MatplotlibPlotter.expected_time_to_trigger(bd, outdir)
-    survplots, survlegend, survtable, hiliter_css, heatmap_css = MatplotlibPlotter.bug_survival_plots(bd, outdir)
+    survplots, survlegend, survtable, hiliter_css, heatmap_css = MatplotlibPlotter.bug_survival_plots(bd, outdir, survival_cache)
     ppool = locals()
 
     env = jinja2.Environment(loader=jinja2.ChoiceLoader(
@@ -98,4 +100,32 @@ def generate_report(bd, outdir, report_title="Report", **kwargs):
 
     for target, html in targets.items():
         with open(os.path.join(outdir, 'targets', f'{target}.md'), 'w') as f:
-            f.write(html)
\ No newline at end of file
+            f.write(html)
+
+def generate_comparison(mbd, outdir, survival_cache=None, **kwargs):
+    """
+    Generates the report of every experiment in a subdirectory of outdir named
+    after it, and the tables comparing the fuzzers of all experiments in
+    outdir/data
+    """
+    for name, bd in mbd.items():
+        generate_report(bd, os.path.join(outdir, name), report_title=name,
+            survival_cache=survival_cache, **kwargs)
+
+    datadir = os.path.join(outdir, 'data')
+    ensure_dir(datadir)
+
+    bugs = DataProcessing.number_of_unique_bugs_found_data(mbd)
+    bugs.sort_index().to_csv(os.path.join(datadir, 'unique_bugs_found.csv'))
+
+    uniq_bugs, _, _ = DataProcessing.unique_bugs_per_target_data(mbd, Metric.TRIGGERED.value)
+    uniq_bugs = uniq_bugs.groupby(['Experiment', 'Fuzzer', 'Target'], observed=True) \
+                         .agg(['mean', 'std'])
+    uniq_bugs.sort_index().to_csv(os.path.join(datadir, 'unique_bugs_per_target.csv'))
+
+    ett, agg = DataProcessing.expected_time_to_trigger_data(mbd)
+    ett.to_csv(os.path.join(datadir, 'expected_ttb.csv'))
+    agg.rename('Aggregate').to_csv(os.path.join(datadir, 'aggregate_ttb.csv'))
+
+    _, means = DataProcessing.bug_survival_data(mbd, survival_cache)
+    means.to_csv(os.path.join(datadir, 'mean_survival.csv'))
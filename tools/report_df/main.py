@@ -3,22 +3,51 @@ import json
 import jinja2
 from Metric import Metric
 import MatplotlibPlotter
-from BenchmarkData import BenchmarkData
+from BenchmarkData import BenchmarkData, MultiBenchmarkData
 import DataProcessing
-from ReportGeneration import generate_report
+from ReportGeneration import generate_comparison, generate_report
 import argparse
 import logging
+import os
+# BenchmarkData puts the benchd tools on the path
+from survival_cache import DEFAULT_MAX_SIZE, SurvivalCache
 
 def parse_args():
     parser = argparse.ArgumentParser(description=(
         "Creates detailed plots from experiment summary and generates a report "
         "for the Magma website."
     ))
-    parser.add_argument("json",
-        help="The experiment summary JSON file generated by the benchd tool.")
+    parser.add_argument("json", nargs="+",
+        help=("The experiment summary JSON file generated by the benchd tool. "
+              "With several summaries, every experiment gets its own report "
+              "in a subdirectory of OUTDIR, and the tables comparing all of "
+              "them are stored in OUTDIR/data."))
     parser.add_argument("outdir",
         help="The path to the directory where webpage output and hierarchy "
              "will be stored.")
+    parser.add_argument("--names", nargs="+", metavar="NAME",
+        help=("The names of the experiments, one per summary. Default: the "
+              "names of the summary files, without their extension."))
+    parser.add_argument("--fuzzers", nargs="+", metavar="FUZZER",
+        help="Only report on these fuzzers. Default: all of them.")
+    parser.add_argument("--targets", nargs="+", metavar="TARGET",
+        help="Only report on these targets. Default: all of them.")
+    parser.add_argument("--programs", nargs="+", metavar="PROGRAM",
+        help="Only report on these programs. Default: all of them.")
+    parser.add_argument("--frame-cache-dir", metavar="DIR",
+        help=("The directory where a binary snapshot of the loaded summary is "
+              "kept, to skip parsing it again while it is unchanged. A "
+              "report on some fuzzers, targets or programs reads only those "
+              "from the snapshot, but does not write one. "
+              "Default: the directory of every summary. Requires pyarrow."))
+    parser.add_argument("--no-frame-cache", action="store_true",
+        help="Always parse the summary, without a binary snapshot.")
+    parser.add_argument("--survival-cache", metavar="FILE",
+        help=("A cache of fitted survival curves, which is reused across runs. "
+              "It can be shared with benchd/survival_analysis.py."))
+    parser.add_argument("--survival-cache-size", type=int,
+        default=DEFAULT_MAX_SIZE >> 20,
+        help="The maximum size of the survival cache (in MiB).")
     parser.add_argument('-v', '--verbose', action='count', default=0,
         help=("Controls the verbosity of messages. "
             "-v prints info. -vv prints debug. Default: warnings and higher.")
@@ -38,8 +67,31 @@ def configure_verbosity(level):
 def main():
     args = parse_args()
     configure_verbosity(args.verbose)
-    bd = BenchmarkData(args.json, config={'duration': 7 * 24 * 60 * 60, 'trials': 10})
-    generate_report(bd, args.outdir)
+    cache_dirs = [None] * len(args.json)
+    if not args.no_frame_cache:
+        cache_dirs = [args.frame_cache_dir or os.path.dirname(filename)
+            for filename in args.json]
+    options = dict(fuzzers=args.fuzzers, targets=args.targets,
+        programs=args.programs,
+        config={'duration': 7 * 24 * 60 * 60, 'trials': 10})
+    if len(args.json) == 1:
+        bd = BenchmarkData(args.json[0], cache_dir=cache_dirs[0], **options)
+    else:
+        bd = MultiBenchmarkData(args.json, names=args.names,
+            cache_dirs=cache_dirs, **options)
+    survival_cache = None
+    if args.survival_cache:
+        survival_cache = SurvivalCache(args.survival_cache,
+            args.survival_cache_size << 20)
+    try:
+        if len(args.json) == 1:
+            generate_report(bd, args.outdir, survival_cache=survival_cache)
+        else:
+            generate_comparison(bd, args.outdir,
+                survival_cache=survival_cache)
+    finally:
+        if survival_cache is not None:
+            survival_cache.close()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file